@@ -0,0 +1,66 @@
+"""Сравнивает декодеры JSON (json, orjson, simdjson) на синтетическом логе loguru.
+
+Для каждого установленного декодера измеряется скорость декодирования строк
+и полного разбора parse_log (строк/с).
+
+Запуск: python benchmarks/json_backends.py [--lines N] [--repeat N] [путь к .log]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import decoders
+from utils import parse_log
+
+from sample_logs import write_sample_log
+
+
+def best_rate(function, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            function(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("path", nargs="?", help="log file; generated when omitted")
+    arg_parser.add_argument("--lines", type=int, default=100000, help="lines to generate")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per backend, the best one is reported")
+    args = arg_parser.parse_args()
+
+    path = args.path
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix=".log")
+        os.close(handle)
+        write_sample_log(path, args.lines)
+
+    try:
+        with open(path, 'rb') as f:
+            lines = [line.rstrip(b'\r\n') for line in f if line.strip()]
+    finally:
+        if args.path is None:
+            os.remove(path)
+
+    default = decoders.backend_name
+    print(f"{len(lines)} lines, default backend: {default}")
+    try:
+        for name in decoders.BACKENDS:
+            decoders.set_backend(name)
+            decode_rate = best_rate(decoders.loads, lines, args.repeat)
+            parse_rate = best_rate(parse_log, lines, args.repeat)
+            print(f"{name:>10}: decode {decode_rate:12,.0f} lines/s, parse_log {parse_rate:12,.0f} lines/s")
+    finally:
+        decoders.set_backend(default)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Сравнивает скорость разбора (строк/с) с прогрессом на каждую строку и с ограниченным прогрессом.
+
+Запуск: python benchmarks/parse_progress.py [--lines N] [путь к .log]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+from logfile import LogFile
+from parser import JobThread, index_job
+from records import LogStore
+from widgets import CustomProgressDialog
+
+from sample_logs import write_sample_log
+
+
+class PerLineParsingThread(JobThread):
+    """Прежний цикл: сигнал прогресса и processEvents на каждую строку."""
+
+    def run(self):
+        store, = self.args
+        total_lines = len(store)
+        for idx in range(total_lines):
+            store.parse_range(idx, idx + 1)
+            self.progress.emit(int((idx + 1) / total_lines * 100))
+            QApplication.processEvents()
+
+
+def measure(app, thread_class, path):
+    store = LogStore(LogFile(path))
+    updates = []
+    dialog = CustomProgressDialog("Processing", "Processing log file, please wait...")
+    dialog.show()
+    thread = thread_class('index', index_job, (store,))
+    thread.progress.connect(updates.append)
+    thread.progress.connect(dialog.progress_bar.setValue)
+    start = time.perf_counter()
+    thread.start()
+    while not thread.isFinished():
+        app.processEvents()
+        thread.wait(5)
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    dialog.hide()
+    store.close()
+    return len(store) / elapsed, len(updates)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("path", nargs="?", help="log file; generated when omitted")
+    arg_parser.add_argument("--lines", type=int, default=200000, help="lines to generate")
+    args = arg_parser.parse_args()
+
+    app = QApplication(sys.argv)
+    path = args.path
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix=".log")
+        os.close(handle)
+        write_sample_log(path, args.lines)
+
+    try:
+        for name, thread_class in (("per-line", PerLineParsingThread), ("throttled", JobThread)):
+            rate, updates = measure(app, thread_class, path)
+            print(f"{name:>10}: {rate:12,.0f} lines/s, {updates} progress updates")
+    finally:
+        if args.path is None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Генератор синтетических логов в формате loguru serialize=True для бенчмарков.
+
+Лог воспроизводим: при тех же параметрах и seed файл получается тем же.
+"""
+import json
+import random
+
+LEVELS = [("INFO", 20, "ℹ️"), ("DEBUG", 10, "🐞"), ("WARNING", 30, "⚠️"), ("ERROR", 40, "❌")]
+LEVEL_FIELDS = {name: (name, no, icon) for name, no, icon in LEVELS + [("CRITICAL", 50, "☠️")]}
+COUNT_SUFFIXES = {'k': 1000, 'M': 1000000}
+
+
+def sample_record(idx, level=None, items=0):
+    """Запись loguru с полным набором полей record, как их пишет sink с serialize=True.
+
+    level - (имя, номер, значок), по умолчанию уровни идут по кругу; items -
+    число позиций чека в extra, чтобы задать размер вложенного extra.
+    """
+    name, no, icon = level or LEVELS[idx % len(LEVELS)]
+    seconds = idx // 1000
+    time_repr = f"2024-05-01 {10 + seconds // 3600 % 14:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{idx % 1000:03d}000+03:00"
+    message = f"Receipt {idx} processed"
+    extra = {"shift_id": idx % 50, "receipt": {"id": f"{idx:08x}-kkt", "total": idx % 9973 / 100}}
+    if items:
+        extra["receipt"]["items"] = [
+            {"name": f"Товар {number}", "price": (idx + number) % 997 / 10, "quantity": 1 + number % 3}
+            for number in range(items)
+        ]
+    record = {
+        "elapsed": {"repr": f"0:00:{seconds % 60:02d}.{idx % 1000:03d}000", "seconds": seconds + idx % 1000 / 1000},
+        "exception": None,
+        "extra": extra,
+        "file": {"name": "receipts.py", "path": "/opt/km/receipts.py"},
+        "function": "process_receipt",
+        "level": {"icon": icon, "name": name, "no": no},
+        "line": 120 + idx % 40,
+        "message": message,
+        "module": "receipts",
+        "name": "km.receipts",
+        "process": {"id": 4242, "name": "MainProcess"},
+        "thread": {"id": 140000000000000, "name": "MainThread"},
+        "time": {"repr": time_repr, "timestamp": 1714546800 + seconds + idx % 1000 / 1000},
+    }
+    text = f"{time_repr[:23]} | {name:<8} | km.receipts:process_receipt:{record['line']} - {message}\n"
+    return {"text": text, "record": record}
+
+
+def malformed_line(idx, rng):
+    """Испорченная строка: обрезанный JSON, простой текст или JSON без record."""
+    kind = rng.randrange(3)
+    if kind == 0:
+        line = json.dumps(sample_record(idx), ensure_ascii=False)
+        return line[:rng.randrange(1, len(line))]
+    if kind == 1:
+        return f"Traceback (most recent call last): receipt {idx}"
+    return json.dumps({"text": f"receipt {idx}"})
+
+
+def parse_level_mix(text):
+    """Доли уровней из строки вида 'INFO=70,DEBUG=20,ERROR=10'."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip().upper()
+        if name not in LEVEL_FIELDS:
+            raise ValueError(f"Unknown level {name!r}, expected one of {', '.join(LEVEL_FIELDS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def parse_count(text):
+    """Число строк: 10000, 10k или 1M."""
+    multiplier = COUNT_SUFFIXES.get(text[-1:], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def write_sample_log(path, lines, level_mix=None, extra_items=0, malformed_ratio=0.0, seed=0):
+    """Пишет lines строк лога.
+
+    level_mix - {уровень: доля}, без него уровни идут по кругу; extra_items -
+    число позиций чека в extra; malformed_ratio - доля испорченных строк.
+    """
+    rng = random.Random(seed)
+    names, weights = zip(*level_mix.items()) if level_mix else (None, None)
+    with open(path, 'w', encoding='utf-8') as f:
+        for idx in range(lines):
+            if malformed_ratio and rng.random() < malformed_ratio:
+                f.write(malformed_line(idx, rng) + "\n")
+                continue
+            level = LEVEL_FIELDS[rng.choices(names, weights)[0]] if level_mix else None
+            f.write(json.dumps(sample_record(idx, level, extra_items), ensure_ascii=False) + "\n")
@@ -0,0 +1,302 @@
+"""Набор бенчмарков просмотрщика на синтетических логах loguru.
+
+Для каждого размера лога в отдельных процессах измеряются:
+  parse - скорость parse_log и полного разбора с индексами (строк/с), пик памяти;
+  gui   - время до первой строки таблицы и до конца загрузки, задержка
+          смены фильтра и поиска, вывод подробностей 500 записей (окно без
+          экрана, QT_QPA_PLATFORM=offscreen), пик памяти.
+Результаты пишутся в JSON; с --baseline они сравниваются с сохраненным
+прогоном, ухудшение больше --tolerance дает код выхода 1.
+
+Запуск:
+    python benchmarks/suite.py --sizes 10k,1M -o results.json
+    python benchmarks/suite.py --sizes 10k,1M --baseline results.json
+    python benchmarks/suite.py --sizes 10M --level-mix INFO=70,DEBUG=20,WARNING=7,ERROR=3 --malformed 0.01
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Модуля resource нет в Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sample_logs import parse_count, parse_level_mix, write_sample_log
+
+SCENARIOS = ('parse', 'gui')
+PARSE_LOG_LINES = 100000
+DETAIL_ROWS = 500
+FILTER_QUERIES = ['level == ERROR', 'level >= WARNING', 'extra.shift_id == 7', 'message ~ /Receipt 1\\d* /', '']
+SEARCH_QUERIES = ['receipt', '/"shift_id": 7\\b/', '']
+# Времена короче этого - шум таймера и цикла событий, их рост не считается ухудшением
+NOISE_SECONDS = 0.01
+
+
+def peak_rss_mb():
+    """Пик резидентной памяти процесса и его дочерних процессов (пула разбора) в МБ.
+
+    Без модуля resource пик процесса берется из psutil (в Windows - peak_wset,
+    иначе текущий rss), а пик дочерних процессов неизвестен; без обоих - None.
+    """
+    if resource is not None:
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return {
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            'children_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+        }
+    peak = None
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        peak = getattr(memory, 'peak_wset', memory.rss) / 1024 / 1024
+    return {'peak_rss_mb': peak, 'children_peak_rss_mb': None}
+
+
+def measure_parse(path):
+    from ingest import parse_parallel, parse_serial, should_parse_parallel
+    from logfile import open_log
+    from records import LogStore
+    from utils import parse_log
+
+    with open(path, 'rb') as f:
+        lines = [line.rstrip(b'\r\n') for _, line in zip(range(PARSE_LOG_LINES), f) if line.strip()]
+    start = time.perf_counter()
+    for line in lines:
+        parse_log(line)
+    parse_log_rate = len(lines) / (time.perf_counter() - start) if lines else 0
+    del lines
+
+    start = time.perf_counter()
+    store = LogStore(open_log(path))
+    opened = time.perf_counter()
+    if should_parse_parallel(store):
+        parse_parallel(store)
+    else:
+        parse_serial(store)
+    parsed = time.perf_counter()
+
+    total, size = len(store), store.source.size
+    store.close()
+    return {
+        'lines': total,
+        'parse_log_lines_per_sec': parse_log_rate,
+        'line_index_seconds': opened - start,
+        'parse_seconds': parsed - opened,
+        'parse_lines_per_sec': total / (parsed - opened),
+        'parse_mb_per_sec': size / (parsed - opened) / 1024 / 1024,
+        **peak_rss_mb(),
+    }
+
+
+def wait_until(app, condition, timeout=3600):
+    """Обрабатывает события окна, пока condition не станет истинным; возвращает прошедшее время."""
+    from PyQt5.QtCore import QEventLoop
+
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("Benchmark step did not finish in time")
+        app.processEvents(QEventLoop.AllEvents, 10)
+        # Фоновой задаче нужна GIL, поэтому цикл событий ненадолго ее отдает
+        time.sleep(0.001)
+    return time.perf_counter() - start
+
+
+def measure_gui(path):
+    from PyQt5.QtCore import QItemSelection, QItemSelectionModel
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+
+    app = QApplication(sys.argv)
+    from gui import LogViewer
+
+    # Окно сообщения остановило бы прогон без экрана
+    QMessageBox.warning = QMessageBox.information = staticmethod(lambda *args: None)
+    viewer = LogViewer()
+    viewer.show()
+    idle = lambda: not viewer.jobs.is_busy()
+
+    start = time.perf_counter()
+    viewer.load_file(path)
+    first_row = wait_until(app, lambda: viewer.log_model.row_count > 0)
+    wait_until(app, idle)
+    results = {
+        'lines': len(viewer.store),
+        'first_row_seconds': first_row,
+        'load_seconds': time.perf_counter() - start,
+    }
+
+    for name, edit, apply, queries in (
+        ('filter', viewer.filter_edit, viewer.filter_query, FILTER_QUERIES),
+        ('search', viewer.search_edit, viewer.search_logs, SEARCH_QUERIES),
+    ):
+        for query in queries:
+            edit.setText(query)
+            start = time.perf_counter()
+            apply()
+            wait_until(app, idle)
+            results[f"{name} {query or 'reset'}: switch_seconds"] = time.perf_counter() - start
+
+    rows = min(DETAIL_ROWS, viewer.log_model.row_count)
+    if rows:
+        model = viewer.log_model
+        selection = QItemSelection(model.index(0, 0), model.index(rows - 1, model.columnCount() - 1))
+        start = time.perf_counter()
+        viewer.table_view.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+        wait_until(app, lambda: viewer.detail_position >= len(viewer.detail_indexes))
+        results['detail_render_seconds'] = time.perf_counter() - start
+
+    viewer.close()
+    results.update(peak_rss_mb())
+    return results
+
+
+def run_measure(scenario, path, profile=None):
+    """Выполняет сценарий в текущем процессе; с profile результат cProfile пишется в этот файл."""
+    measure = measure_parse if scenario == 'parse' else measure_gui
+    if profile is None:
+        return measure(path)
+    import cProfile
+
+    profiler = cProfile.Profile()
+    results = profiler.runcall(measure, path)
+    profiler.dump_stats(profile)
+    return results
+
+
+def sample_path(data_dir, lines, args):
+    """Файл лога с заданными параметрами; сгенерированный раньше используется повторно."""
+    mix = args.level_mix.replace('=', '').replace(',', '-') if args.level_mix else 'cycle'
+    name = f"sample-{lines}-{mix}-x{args.extra_items}-m{args.malformed}-s{args.seed}.log"
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        print(f"generating {name}", file=sys.stderr)
+        level_mix = parse_level_mix(args.level_mix) if args.level_mix else None
+        write_sample_log(path + '.tmp', lines, level_mix, args.extra_items, args.malformed, args.seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def run_scenario(scenario, path, profile=None):
+    """Сценарий в отдельном процессе с пустым кэшем, чтобы пик памяти и кэш разбора не смешивались."""
+    with tempfile.TemporaryDirectory() as cache_home:
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen', XDG_CACHE_HOME=cache_home)
+        command = [sys.executable, os.path.abspath(__file__), '--measure', scenario, path]
+        if profile is not None:
+            command += ['--profile', profile]
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+
+def environment():
+    import decoders
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'json_backend': decoders.backend_name,
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Строки сравнения с baseline и признак ухудшения.
+
+    Метрики *_per_sec лучше, когда больше, *_seconds и *_mb - когда меньше;
+    остальные (число строк) и неизмеренные (None) не сравниваются.
+    """
+    lines = []
+    regressed = False
+    for size, scenarios in results['sizes'].items():
+        for scenario, metrics in scenarios.items():
+            old_metrics = baseline.get('sizes', {}).get(size, {}).get(scenario, {})
+            for name, value in metrics.items():
+                old = old_metrics.get(name)
+                if not old or value is None or not name.endswith(('_per_sec', '_seconds', '_mb')):
+                    continue
+                change = (value - old) / old
+                worse = -change if name.endswith('_per_sec') else change
+                mark = ''
+                if worse > tolerance and not (name.endswith('_seconds') and value < NOISE_SECONDS):
+                    mark = '  REGRESSION'
+                    regressed = True
+                lines.append(f"{size:>6} {scenario:<5} {name:<45} {old:12.4g} -> {value:12.4g} {change:+8.1%}{mark}")
+    return lines, regressed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', default='10k,1M', help='log sizes in lines, e.g. 10k,1M,10M (default: 10k,1M)')
+    arg_parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='parse, gui or both (default)')
+    arg_parser.add_argument('--level-mix', default='', help='level weights, e.g. INFO=70,DEBUG=20,ERROR=10')
+    arg_parser.add_argument('--extra-items', type=int, default=0, help='receipt items per record extra')
+    arg_parser.add_argument('--malformed', type=float, default=0.0, help='share of malformed lines, e.g. 0.01')
+    arg_parser.add_argument('--seed', type=int, default=0, help='generator seed')
+    arg_parser.add_argument('--data-dir', help='where generated logs are kept and reused (default: temp dir)')
+    arg_parser.add_argument('-o', '--output', help='write results as JSON to this file')
+    arg_parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a regression')
+    arg_parser.add_argument('--profile', help='directory for cProfile stats of each scenario (slows the run)')
+    arg_parser.add_argument('--measure', nargs=2, metavar=('SCENARIO', 'PATH'), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.measure:
+        scenario, path = args.measure
+        print(json.dumps(run_measure(scenario, path, args.profile)))
+        return 0
+
+    if args.level_mix:
+        try:
+            parse_level_mix(args.level_mix)
+        except ValueError as e:
+            arg_parser.error(str(e))
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            arg_parser.error(f"unknown scenario {name!r}, expected {', '.join(SCENARIOS)}")
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+
+    results = {'environment': environment(), 'sizes': {}}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for size in args.sizes.split(','):
+            path = sample_path(data_dir, parse_count(size), args)
+            results['sizes'][size] = {}
+            for scenario in scenarios:
+                profile = os.path.join(args.profile, f"{size}-{scenario}.prof") if args.profile else None
+                metrics = results['sizes'][size][scenario] = run_scenario(scenario, path, profile)
+                for name, value in metrics.items():
+                    value = 'n/a' if value is None else format(value, '.4g')
+                    print(f"{size:>6} {scenario:<5} {name:<45} {value:>12}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print(f"\ncompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        print("\n".join(lines))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
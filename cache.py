@@ -0,0 +1,234 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+from logfile import LogFile
+from records import LogStore
+from search import MappedTextIndex, TextIndex
+
+CACHE_MAGIC = b'KMLVC005'
+CACHE_SUFFIX = '.kmcache'
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+HASH_BYTES = 64 * 1024
+HEADER = struct.Struct('<8sI')
+
+
+def cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'km-logviewer')
+
+
+def cache_path(file_path):
+    name = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), name + CACHE_SUFFIX)
+
+
+def content_hash(data, start, end):
+    return hashlib.sha1(data[max(start, 0):end]).hexdigest()
+
+
+def file_key(source):
+    """Идентификатор состояния файла: путь, размер индекса и файла, mtime и хэши начала и конца проиндексированной части."""
+    stat = os.fstat(source.file.fileno())
+    return {
+        'path': os.path.abspath(source.file_path),
+        'size': source.size,
+        'file_size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'head': content_hash(source.data, 0, min(HASH_BYTES, source.size)),
+        'tail': content_hash(source.data, source.size - HASH_BYTES, source.size),
+    }
+
+
+def is_same_prefix(key, source):
+    """Файл совпадает с закэшированным или только дописан в конец.
+
+    Хэши проверяют только начало и конец, поэтому при прежнем размере файла
+    должно совпасть и время изменения: иначе правку в середине без смены
+    размера не заметить.
+    """
+    stat = os.fstat(source.file.fileno())
+    if stat.st_size == key['file_size'] and stat.st_mtime_ns != key['mtime_ns']:
+        return False
+    data = source.data
+    size = key['size']
+    return (
+        len(data) >= size
+        and content_hash(data, 0, min(HASH_BYTES, size)) == key['head']
+        and content_hash(data, size - HASH_BYTES, size) == key['tail']
+    )
+
+
+def write_section(f, sections, name, data):
+    padding = -f.tell() % 8
+    f.write(b'\0' * padding)
+    sections[name] = [f.tell(), len(data) if isinstance(data, bytes) else data.itemsize * len(data)]
+    f.write(data)
+
+
+def save_store(store, max_bytes=CACHE_MAX_BYTES):
+    """Сохраняет колонки и индексы полностью разобранного хранилища в кэш рядом с ~/.cache."""
+    source = store.source
+    if not isinstance(source, LogFile) or not store.is_indexed():
+        return
+
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    sections = {}
+    tokens = store.text_index.tokens()
+    token_offsets = array('Q', [0])
+    postings_offsets = array('Q', [0])
+
+    handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(HEADER.pack(CACHE_MAGIC, 0))
+            write_section(f, sections, 'line_offsets', source.line_offsets)
+            write_section(f, sections, 'levels', store.levels)
+            write_section(f, sections, 'timestamps', store.timestamps)
+            write_section(f, sections, 'utc_offsets', store.utc_offsets)
+            for code, rows in store.level_rows.items():
+                write_section(f, sections, f'level_rows.{code}', rows)
+
+            blob = bytearray()
+            for token in tokens:
+                blob += token.encode('utf-8')
+                token_offsets.append(len(blob))
+            write_section(f, sections, 'tokens', bytes(blob))
+            del blob
+            write_section(f, sections, 'token_offsets', token_offsets)
+
+            f.write(b'\0' * (-f.tell() % 8))
+            postings_start = f.tell()
+            count = 0
+            for token in tokens:
+                rows = store.text_index.rows(token)
+                f.write(rows if isinstance(rows, (array, memoryview)) else array('i', rows))
+                count += len(rows)
+                postings_offsets.append(count)
+            sections['postings'] = [postings_start, count * 4]
+            write_section(f, sections, 'postings_offsets', postings_offsets)
+
+            header = json.dumps({
+                'key': file_key(source),
+                'rows': len(store),
+                'level_names': store.level_names,
+                'patterns': store.patterns.summary(),
+                'sections': sections,
+            }).encode('utf-8')
+            header_start = f.tell()
+            f.write(header)
+            f.seek(0)
+            f.write(HEADER.pack(CACHE_MAGIC, header_start))
+        os.replace(temp_path, cache_path(source.file_path))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    evict(max_bytes)
+
+
+def read_array(data, sections, name, typecode):
+    start, length = sections[name]
+    values = array(typecode)
+    values.frombytes(data[start:start + length])
+    return values
+
+
+def map_section(view, sections, name, typecode):
+    start, length = sections[name]
+    return view[start:start + length].cast(typecode)
+
+
+def load_store(file_path):
+    """Возвращает хранилище из кэша или None, если кэша нет или файл изменился.
+
+    Колонки копируются из отображенного файла кэша одним блоком, полнотекстовый
+    индекс остается отображенным. Если лог был только дописан, новые строки
+    разбираются и добавляются к индексам, после чего кэш перезаписывается.
+    """
+    path = cache_path(file_path)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, header_start = HEADER.unpack(data[:HEADER.size])
+        if magic != CACHE_MAGIC or not header_start:
+            raise ValueError(f"Invalid cache file {path}")
+        header = json.loads(data[header_start:])
+    except (ValueError, struct.error):
+        data.close()
+        os.remove(path)
+        return None
+
+    key = header['key']
+    sections = header['sections']
+    source = LogFile(file_path, read_array(data, sections, 'line_offsets', 'Q'), key['size'])
+    if not is_same_prefix(key, source):
+        source.close()
+        data.close()
+        return None
+    os.utime(path)
+
+    store = LogStore(source)
+    store.level_names = header['level_names']
+    store.level_codes = {name: code for code, name in enumerate(store.level_names)}
+    store.levels = read_array(data, sections, 'levels', 'B')
+    store.timestamps = read_array(data, sections, 'timestamps', 'q')
+    store.utc_offsets = read_array(data, sections, 'utc_offsets', 'h')
+    store.level_rows = {
+        int(name.split('.', 1)[1]): read_array(data, sections, name, 'i')
+        for name in sections if name.startswith('level_rows.')
+    }
+    store.parsed_count = store.indexed_count = header['rows']
+    store.patterns.add_summary(header['patterns'])
+
+    view = memoryview(data)
+    store.text_index = TextIndex(MappedTextIndex(
+        map_section(view, sections, 'tokens', 'B'),
+        map_section(view, sections, 'token_offsets', 'Q'),
+        map_section(view, sections, 'postings_offsets', 'Q'),
+        map_section(view, sections, 'postings', 'i')
+    ))
+    view.release()
+
+    first = len(store)
+    added = source.refresh()
+    if added is None:
+        store.close()
+        return None
+    if added:
+        store.append_rows(added)
+        store.parse_range(first, len(store))
+        store.extend_index(len(store))
+        try:
+            save_store(store)
+        except OSError:
+            pass
+    return store
+
+
+def evict(max_bytes=CACHE_MAX_BYTES):
+    """Удаляет давно не использованные файлы кэша, пока общий размер больше max_bytes."""
+    directory = cache_dir()
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(CACHE_SUFFIX):
+            stat = os.stat(os.path.join(directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(directory, name))
+        total -= size
@@ -0,0 +1,148 @@
+"""Фильтрация, статистика и экспорт логов loguru без графического интерфейса.
+
+Файлы читаются потоком по одной строке (сжатые .gz, .xz, .zst тоже),
+поэтому память не зависит от их размера.
+
+Примеры:
+    km-logviewer app.log.1.gz app.log -f 'level>=ERROR' --format csv -o errors.csv
+    km-logviewer /var/log/kasa/*.log --stats
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import Counter
+
+from decoders import dumps_compact
+from filters import FilterSyntaxError, compile_filter
+from logfile import iter_lines
+from records import LEVELS
+from search import matches_query, record_text
+from utils import format_timestamp, parse_log
+
+FORMATS = ('text', 'jsonl', 'csv', 'raw')
+CSV_COLUMNS = ['Timestamp', 'Level', 'Message', 'Extra']
+
+
+class RecordView:
+    """Одна разобранная запись с интерфейсом хранилища, который нужен фильтрам (строка 0)."""
+
+    def __init__(self):
+        self.level_names = []
+        self.level_codes = {}
+        self.levels = [0]
+        self.timestamps = [0]
+        self.utc_offsets = [0]
+        self.current = None
+
+    def __len__(self):
+        return 1
+
+    def set(self, record):
+        level, timestamp, utc_offset, message, extra = record
+        code = self.level_codes.get(level)
+        if code is None:
+            code = self.level_codes[level] = len(self.level_names)
+            self.level_names.append(level)
+        self.levels[0] = code
+        self.timestamps[0] = timestamp
+        self.utc_offsets[0] = utc_offset
+        self.current = record
+
+    def record(self, idx):
+        return self.current
+
+    def is_indexed(self):
+        return False
+
+
+def filtered_records(file_paths, log_filter=None, search=''):
+    """Записи файлов подряд, подходящие под фильтр и поиск: (исходная строка, запись)."""
+    view = RecordView()
+    for file_path in file_paths:
+        for line in iter_lines(file_path):
+            record = parse_log(line)
+            if search and not matches_query(search, record_text(record[3], record[4])):
+                continue
+            if log_filter is not None:
+                view.set(record)
+                if not log_filter.match(view, 0):
+                    continue
+            yield line, record
+
+
+def record_row(record):
+    level, timestamp, utc_offset, message, extra = record
+    return [format_timestamp(timestamp, utc_offset), level, message, dumps_compact(extra) if extra else '']
+
+
+def write_records(records, output, output_format):
+    """Пишет записи в output и возвращает счетчик по уровням."""
+    counts = Counter()
+    writer = csv.writer(output) if output_format == 'csv' else None
+    if writer is not None:
+        writer.writerow(CSV_COLUMNS)
+
+    for line, record in records:
+        counts[record[0]] += 1
+        if output_format == 'raw':
+            output.write(line.decode('utf-8', 'replace') + '\n')
+        elif output_format == 'jsonl':
+            timestamp, level, message, extra = record_row(record)
+            output.write(dumps_compact({
+                'time': timestamp, 'level': level, 'message': message, 'extra': record[4]
+            }) + '\n')
+        elif writer is not None:
+            writer.writerow(record_row(record))
+        else:
+            timestamp, level, message, extra = record_row(record)
+            output.write(f"{timestamp} | {level:<8} | {' '.join(message.splitlines())}{' | ' + extra if extra else ''}\n")
+    return counts
+
+
+def format_statistics(counts):
+    """Счетчики уровней в том же виде, что и в окне просмотра."""
+    names = LEVELS + sorted(name for name in counts if name not in LEVELS)
+    return "Log Levels Count:\n" + "\n".join(f"{name}: {counts.get(name, 0)}" for name in names) + "\n"
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        prog='km-logviewer', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument('paths', nargs='+', help='log files, read one after another')
+    arg_parser.add_argument('-f', '--filter', default='', help="query, e.g. 'level>=WARNING and extra.shift_id == 42'")
+    arg_parser.add_argument('-s', '--search', default='', help='full-text search: words (AND), OR, "phrase"')
+    arg_parser.add_argument('--format', choices=FORMATS, default='text', help='output format (default: text)')
+    arg_parser.add_argument('-o', '--output', help='write records to this file instead of stdout')
+    arg_parser.add_argument('--stats', action='store_true', help='print per-level counts of matching records')
+    args = arg_parser.parse_args(argv)
+
+    try:
+        log_filter = compile_filter(args.filter) if args.filter.strip() else None
+    except FilterSyntaxError as e:
+        arg_parser.error(str(e))
+
+    records = filtered_records(args.paths, log_filter, args.search.strip())
+    try:
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as output:
+                counts = write_records(records, output, args.format)
+        elif args.stats:
+            counts = Counter(record[0] for line, record in records)
+        else:
+            counts = write_records(records, sys.stdout, args.format)
+        if args.stats:
+            sys.stdout.write(format_statistics(counts))
+        sys.stdout.flush()
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except OSError as e:
+        print(f"km-logviewer: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+BACKEND_ENV = 'KM_LOGVIEWER_JSON'
+PREFERRED_BACKENDS = ('orjson', 'simdjson', 'json')
+
+BACKENDS = {'json': json.loads}
+if simdjson is not None:
+    BACKENDS['simdjson'] = simdjson.loads
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+
+backend_name = None
+fast_loads = json.loads
+
+
+def set_backend(name=None):
+    """Выбирает декодер JSON: по имени, из переменной KM_LOGVIEWER_JSON или самый быстрый установленный."""
+    global backend_name, fast_loads
+    name = name or os.environ.get(BACKEND_ENV)
+    if name is None:
+        name = next(name for name in PREFERRED_BACKENDS if name in BACKENDS)
+    elif name not in BACKENDS:
+        raise ValueError(f"JSON backend {name!r} is not available, expected one of {', '.join(BACKENDS)}")
+    backend_name = name
+    fast_loads = BACKENDS[name]
+    return name
+
+
+def loads(data):
+    """Декодирует str или bytes выбранным декодером.
+
+    Быстрые декодеры строже стандартного (NaN, Infinity), поэтому при ошибке
+    строка разбирается повторно через json.loads, и результат не зависит от
+    установленных пакетов.
+    """
+    try:
+        return fast_loads(data)
+    except ValueError:
+        if fast_loads is json.loads:
+            raise
+        return json.loads(data)
+
+
+def dumps_compact(value):
+    """Компактная однострочная JSON-строка для таблицы и поиска по полям."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+set_backend()
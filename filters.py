@@ -0,0 +1,508 @@
+import json
+import operator
+import re
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from heapq import merge
+
+from jobs import checkpoints
+from records import LEVEL_SEVERITY
+from search import tokenize
+from utils import EPOCH, MICROSECOND, NO_TIMESTAMP
+
+SECOND = 1000000
+MINUTE = 60 * SECOND
+DAY = 24 * 60 * MINUTE
+MIN_TIME = -(1 << 62)
+MAX_TIME = 1 << 62
+
+QUERY_TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<regex>/(?:[^/\\]|\\.)*/i?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<range>\.\.)
+  | (?P<op>==|!=|<=|>=|!~|=~|<|>|~|=)
+  | (?P<paren>[()])
+  | (?P<word>(?:[^\s()"'<>=!~/.]|\.(?!\.))+)
+)''', re.X)
+TIME_RE = re.compile(
+    r'(?:(\d{4})-(\d{2})-(\d{2}))?[ T]?'
+    r'(?:(\d{1,2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6}))?)?)?$'
+)
+ESCAPE_RE = re.compile(r'\\(.)')
+
+COMPARISONS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge
+}
+REGEX_OPS = {'~', '=~', '!~'}
+KEYWORDS = {'and', 'or', 'not', 'between'}
+TOKEN_NAMES = {'word': 'field name', 'op': 'operator', 'range': '..'}
+
+
+class FilterSyntaxError(ValueError):
+    pass
+
+
+def tokenize_query(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = QUERY_TOKEN_RE.match(text, pos)
+        if match is None:
+            raise FilterSyntaxError(f"Unexpected character at position {pos + 1}: {text[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'word' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def parse_literal(kind, value):
+    if kind == 'string':
+        return ESCAPE_RE.sub(r'\1', value[1:-1])
+    if kind == 'regex':
+        flags = re.IGNORECASE if value.endswith('i') else 0
+        body = value[1:value.rindex('/')].replace('\\/', '/')
+        try:
+            return re.compile(body, flags)
+        except re.error as e:
+            raise FilterSyntaxError(f"Invalid regular expression {value}: {e}")
+    lowered = value.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    if lowered == 'null':
+        return None
+    for number_type in (int, float):
+        try:
+            return number_type(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_time_literal(value):
+    """Разбирает время запроса в (начало, длительность, есть ли дата).
+
+    Начало - микросекунды от эпохи по местным часам записи (если указана
+    дата) или от полуночи; длительность - точность литерала, например
+    минута для "10:00" или сутки для "2024-05-01".
+    """
+    match = TIME_RE.match(str(value).strip())
+    if match is None or not any(match.groups()):
+        raise FilterSyntaxError(f"Invalid time {value!r}, expected HH:MM[:SS[.ffffff]] and/or YYYY-MM-DD")
+    year, month, day, hour, minute, second, fraction = match.groups()
+
+    start = 0
+    span = DAY
+    if hour is not None:
+        start = (int(hour) * 60 + int(minute)) * MINUTE
+        span = MINUTE
+        if second is not None:
+            start += int(second) * SECOND
+            span = SECOND
+        if fraction is not None:
+            start += int(fraction.ljust(6, '0'))
+            span = 10 ** (6 - len(fraction))
+        if start >= DAY:
+            raise FilterSyntaxError(f"Invalid time of day {value!r}")
+
+    if year is None:
+        return start, span, False
+    try:
+        date = datetime(int(year), int(month), int(day))
+    except ValueError as e:
+        raise FilterSyntaxError(f"Invalid date {value!r}: {e}")
+    return (date - EPOCH) // MICROSECOND + start, span, True
+
+
+class Node(ABC):
+    """Узел выражения фильтра; rows и estimate по умолчанию - полный просмотр через match."""
+
+    def estimate(self, store):
+        """Число строк-кандидатов по индексам или None, если нужен полный просмотр."""
+        return None
+
+    def rows(self, store, progress=None):
+        """Подходящие строки; progress(позиция, всего) вызывается по ходу просмотра и может прервать его."""
+        return array('i', [idx for idx in checkpoints(range(len(store)), progress) if self.match(store, idx)])
+
+    @abstractmethod
+    def match(self, store, idx):
+        """Подходит ли строка idx."""
+
+
+class And(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, store):
+        estimates = [child.estimate(store) for child in self.children]
+        estimates = [estimate for estimate in estimates if estimate is not None]
+        return min(estimates) if estimates else None
+
+    def rows(self, store, progress=None):
+        indexed = [(child.estimate(store), pos) for pos, child in enumerate(self.children)]
+        indexed = [(estimate, pos) for estimate, pos in indexed if estimate is not None]
+        if not indexed:
+            return super().rows(store, progress)
+
+        best = self.children[min(indexed)[1]]
+        others = [child for child in self.children if child is not best]
+        return array('i', [
+            idx for idx in checkpoints(best.rows(store, progress), progress)
+            if all(child.match(store, idx) for child in others)
+        ])
+
+    def match(self, store, idx):
+        return all(child.match(store, idx) for child in self.children)
+
+
+class Or(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, store):
+        estimates = [child.estimate(store) for child in self.children]
+        return None if None in estimates else sum(estimates)
+
+    def rows(self, store, progress=None):
+        if self.estimate(store) is None:
+            return super().rows(store, progress)
+        rows = set()
+        for child in self.children:
+            rows.update(child.rows(store, progress))
+        return array('i', sorted(rows))
+
+    def match(self, store, idx):
+        return any(child.match(store, idx) for child in self.children)
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+
+    def match(self, store, idx):
+        return not self.child.match(store, idx)
+
+
+class LevelCompare(Node):
+    def __init__(self, op, level):
+        if op in REGEX_OPS:
+            raise FilterSyntaxError("Regular expressions are not supported for level")
+        self.compare = COMPARISONS[op]
+        self.level = str(level).upper()
+        self.by_name = op in ('==', '=', '!=')
+        if not self.by_name and self.level not in LEVEL_SEVERITY:
+            raise FilterSyntaxError(f"Unknown level {level!r} for {op}, expected one of {', '.join(LEVEL_SEVERITY)}")
+
+    def accepts(self, name):
+        if self.by_name:
+            return self.compare(name, self.level)
+        severity = LEVEL_SEVERITY.get(name)
+        return severity is not None and self.compare(severity, LEVEL_SEVERITY[self.level])
+
+    def codes(self, store):
+        return [code for code, name in enumerate(store.level_names) if self.accepts(name)]
+
+    def estimate(self, store):
+        if not store.is_indexed():
+            return None
+        return sum(len(store.level_rows.get(code, ())) for code in self.codes(store))
+
+    def rows(self, store, progress=None):
+        if not store.is_indexed():
+            return super().rows(store, progress)
+        arrays = [store.level_rows[code] for code in self.codes(store) if code in store.level_rows]
+        if len(arrays) == 1:
+            return arrays[0]
+        return array('i', merge(*arrays))
+
+    def match(self, store, idx):
+        return self.accepts(store.level_names[store.levels[idx]])
+
+
+class TimeRange(Node):
+    """Условие на время записи по местным часам: абсолютное или время суток.
+
+    Строки выбираются бинарным поиском по индексу времени хранилища,
+    окна расширяются на разброс часовых поясов и затем проверяются точно.
+    """
+
+    def __init__(self, low, high, absolute, wrap=False):
+        self.absolute = absolute
+        if low <= high:
+            self.windows = [(low, high)]
+        elif wrap and not absolute:
+            self.windows = [(low, DAY - 1), (0, high)]
+        else:
+            self.windows = []
+
+    def store_windows(self, store):
+        if self.absolute:
+            return self.windows
+        time_index = store.time_index()
+        if not len(time_index):
+            return []
+        first_day = (time_index.times[0] + min(store.utc_offsets) * MINUTE) // DAY
+        last_day = (time_index.times[-1] + max(store.utc_offsets) * MINUTE) // DAY
+        return [
+            (day * DAY + low, day * DAY + high)
+            for day in range(first_day, last_day + 1)
+            for low, high in self.windows
+        ]
+
+    def epoch_bounds(self, store):
+        if not len(store):
+            return []
+        min_offset = min(store.utc_offsets) * MINUTE
+        max_offset = max(store.utc_offsets) * MINUTE
+        return [(low - max_offset, high - min_offset) for low, high in self.store_windows(store)]
+
+    def estimate(self, store):
+        times = store.time_index().times
+        return sum(bisect_right(times, high) - bisect_left(times, low) for low, high in self.epoch_bounds(store))
+
+    def rows(self, store, progress=None):
+        time_index = store.time_index()
+        rows = set()
+        for low, high in self.epoch_bounds(store):
+            rows.update(
+                idx for idx in checkpoints(time_index.rows_between(low, high), progress) if self.match(store, idx)
+            )
+        return array('i', sorted(rows))
+
+    def match(self, store, idx):
+        timestamp = store.timestamps[idx]
+        if timestamp == NO_TIMESTAMP:
+            return False
+        wall = timestamp + store.utc_offsets[idx] * MINUTE
+        if not self.absolute:
+            wall %= DAY
+        return any(low <= wall <= high for low, high in self.windows)
+
+
+def time_range(op, low, high=None):
+    low_start, low_span, absolute = parse_time_literal(low)
+    if high is not None:
+        high_start, high_span, high_absolute = parse_time_literal(high)
+        if high_absolute != absolute:
+            raise FilterSyntaxError("Both ends of a time range must either include a date or not")
+        return TimeRange(low_start, high_start + high_span - 1, absolute, wrap=True)
+
+    if op in REGEX_OPS or op == '!=':
+        raise FilterSyntaxError(f"Operator {op} is not supported for time")
+    low_end = low_start + low_span - 1
+    start, stop = (0, DAY - 1) if not absolute else (MIN_TIME, MAX_TIME)
+    bounds = {
+        '==': (low_start, low_end), '=': (low_start, low_end),
+        '<': (start, low_start - 1), '<=': (start, low_end),
+        '>': (low_end + 1, stop), '>=': (low_start, stop)
+    }[op]
+    return TimeRange(bounds[0], bounds[1], absolute)
+
+
+class FieldCompare(Node):
+    """Условие на message или значение extra по пути (extra.receipt.id)."""
+
+    def __init__(self, path, op, value):
+        self.path = path
+        self.op = op
+        self.value = value
+        if op in REGEX_OPS:
+            self.pattern = value if isinstance(value, re.Pattern) else re.compile(re.escape(str(value)))
+        elif isinstance(value, re.Pattern):
+            raise FilterSyntaxError(f"Regular expression requires ~ or !~, not {op}")
+        else:
+            self.compare = COMPARISONS[op]
+
+    def field_value(self, store, idx):
+        level, timestamp, utc_offset, message, extra = store.record(idx)
+        if self.path[0] == 'message':
+            return message
+        value = extra
+        for key in self.path[1:]:
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+            elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                value = value[int(key)]
+            else:
+                raise KeyError(key)
+        return value
+
+    def index_tokens(self):
+        """Токены, которые есть в тексте каждой подходящей записи, или пустой список.
+
+        Только для строк и целых: у null, true/false и дробных чисел запись
+        в JSON не совпадает с литералом (None и null, 42.0 и 42), такие
+        условия проверяются полным просмотром. Так же проверяются строки,
+        похожие на объект или список: с ними сравнивается JSON значения,
+        а ключи extra в индекс не попадают.
+        """
+        literal = self.value
+        if isinstance(literal, bool) or not isinstance(literal, (str, int)):
+            return []
+        if isinstance(literal, str) and literal.lstrip()[:1] in ('{', '['):
+            return []
+        return tokenize(str(literal))
+
+    def estimate(self, store):
+        if self.op not in ('==', '=') or not store.is_indexed():
+            return None
+        tokens = self.index_tokens()
+        if not tokens:
+            return None
+        return min(len(store.text_index.rows(token)) for token in tokens)
+
+    def rows(self, store, progress=None):
+        if self.estimate(store) is None:
+            return super().rows(store, progress)
+        tokens = sorted(set(self.index_tokens()), key=lambda token: len(store.text_index.rows(token)))
+        candidates = set(store.text_index.rows(tokens[0]))
+        for token in tokens[1:]:
+            candidates.intersection_update(store.text_index.rows(token))
+        return array('i', [idx for idx in checkpoints(sorted(candidates), progress) if self.match(store, idx)])
+
+    def match(self, store, idx):
+        try:
+            value = self.field_value(store, idx)
+        except KeyError:
+            return self.op == '!='
+
+        if self.op in REGEX_OPS:
+            text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            return (self.pattern.search(text) is not None) != (self.op == '!~')
+
+        literal = self.value
+        if isinstance(literal, (int, float)) and not isinstance(literal, bool):
+            if isinstance(value, bool):
+                return self.op == '!='
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return self.op == '!='
+        elif isinstance(literal, str) and not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False)
+        elif literal is None or isinstance(literal, bool):
+            return self.compare(value is literal, True)
+        try:
+            return self.compare(value, literal)
+        except TypeError:
+            return False
+
+
+class QueryParser:
+    def __init__(self, text):
+        self.tokens = tokenize_query(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            expected = value or TOKEN_NAMES.get(kind, kind) or 'more input'
+            found = token[1] if token[0] is not None else 'end of query'
+            raise FilterSyntaxError(f"Expected {expected}, found {found!r}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterSyntaxError("Empty filter")
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise FilterSyntaxError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ('keyword', 'or'):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while self.peek() == ('keyword', 'and'):
+            self.take()
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self):
+        if self.peek() == ('keyword', 'not'):
+            self.take()
+            return Not(self.parse_unary())
+        if self.peek() == ('paren', '('):
+            self.take()
+            node = self.parse_or()
+            self.take('paren', ')')
+            return node
+        return self.parse_comparison()
+
+    def parse_value(self):
+        kind, value = self.peek()
+        if kind not in ('word', 'string', 'regex'):
+            raise FilterSyntaxError(f"Expected a value, found {value if kind else 'end of query'!r}")
+        self.take()
+        return kind, value
+
+    def parse_text(self):
+        kind, value = self.parse_value()
+        if kind == 'regex':
+            raise FilterSyntaxError(f"Unexpected regular expression {value}")
+        return value[1:-1] if kind == 'string' else value
+
+    def parse_comparison(self):
+        kind, field = self.take('word')
+        path = field.split('.')
+        if path[0] not in ('level', 'time', 'message', 'extra') or (path[0] != 'extra' and len(path) > 1):
+            raise FilterSyntaxError(f"Unknown field {field!r}, expected level, time, message or extra.<key>")
+
+        if self.peek() == ('keyword', 'between'):
+            self.take()
+            if path[0] != 'time':
+                raise FilterSyntaxError("between is only supported for time")
+            low = self.parse_text()
+            self.take('range')
+            high = self.parse_text()
+            return time_range('between', low, high)
+
+        op = self.take('op')[1]
+        if path[0] == 'time':
+            return time_range(op, self.parse_text())
+        if path[0] == 'level':
+            return LevelCompare(op, self.parse_text())
+        return FieldCompare(path, op, parse_literal(*self.parse_value()))
+
+
+class CompiledFilter:
+    """Фильтр, скомпилированный один раз из текстового выражения.
+
+    Пример: level>=WARNING and extra.shift_id == 42 and time between 10:00..11:00 and message ~ /timeout/
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.node = QueryParser(text).parse()
+
+    def rows(self, store, candidates=None, progress=None):
+        """Возвращает array('i') подходящих строк; candidates ограничивает проверку заданными строками.
+
+        progress(позиция, всего) вызывается по ходу просмотра; исключение из него прерывает фильтрацию.
+        """
+        if candidates is not None:
+            return array('i', [idx for idx in checkpoints(candidates, progress) if self.node.match(store, idx)])
+        return self.node.rows(store, progress)
+
+    def match(self, store, idx):
+        return self.node.match(store, idx)
+
+
+def compile_filter(text):
+    return CompiledFilter(text)
@@ -0,0 +1,171 @@
+import json
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_left
+from contextlib import closing
+from itertools import compress
+
+from filters import FilterSyntaxError
+from ingest import pool_map, split_ranges
+from merge import MergedLogSource
+
+GREP_CHUNK_BYTES = 4 * 1024 * 1024
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+RAW_PATTERN_RE = re.compile(r'/((?:[^/\\]|\\.)*)/(i?)', re.S)
+# Один символ UTF-8 без перевода строки: точка регулярного выражения по байтам
+UTF8_DOT = r'(?:[^\n\x80-\xff]|[\xc0-\xff][\x80-\xbf]*)'
+
+
+def json_escaped(body, ignore_case=False):
+    """Переводит выражение для поиска по байтам UTF-8 сырых строк.
+
+    loguru с serialize=True пишет не-ASCII текст экранированным, поэтому
+    в сырой строке кириллица сообщения выглядит как \\u041e\\u0448...;
+    не-ASCII символ заменяется на (?:символ|\\uXXXX), а с ignore_case - на
+    такие же варианты обоих регистров: IGNORECASE по байтам понимает только
+    ASCII. Одиночная точка совпадает с целым символом UTF-8, а не с его
+    байтом; .* и .+ остаются побайтовыми: так они намного быстрее, а
+    найденные строки почти всегда те же. Не-ASCII символы внутри [...] по байтам не выразить, они отклоняются.
+    """
+    parts = []
+    in_class = False
+    escaped = False
+    for pos, char in enumerate(body):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif in_class:
+            if ord(char) > 127:
+                raise FilterSyntaxError(f"Non-ASCII character {char!r} inside [...] is not supported in raw line search")
+        elif char == '.' and body[pos + 1:pos + 2] not in ('*', '+'):
+            char = UTF8_DOT
+        elif ord(char) > 127:
+            variants = dict.fromkeys([char, char.lower(), char.upper()] if ignore_case else [char])
+            char = '(?:' + '|'.join(
+                f"{variant}|{re.escape(json.dumps(variant)[1:-1])}" for variant in variants
+            ) + ')'
+        parts.append(char)
+    return ''.join(parts)
+
+
+def compile_raw_pattern(text):
+    """Регулярное выражение по байтам сырых строк для запроса /regex/ или /regex/i, иначе None."""
+    match = RAW_PATTERN_RE.fullmatch(text)
+    if match is None:
+        return None
+    body = json_escaped(match.group(1).replace('\\/', '/'), bool(match.group(2)))
+    flags = re.MULTILINE | (re.IGNORECASE if match.group(2) else 0)
+    try:
+        return re.compile(body.encode('utf-8'), flags)
+    except re.error as e:
+        raise FilterSyntaxError(f"Invalid regular expression {text}: {e}")
+
+
+def grep_block(data, pattern, start, end, base=0):
+    """Смещения начала строк data[start:end] с совпадением pattern, сдвинутые на base.
+
+    После совпадения поиск продолжается со следующей строки, так что
+    строка попадает в результат один раз.
+    """
+    starts = array('Q')
+    search = pattern.search
+    pos = start
+    while pos < end:
+        match = search(data, pos, end)
+        if match is None:
+            break
+        line_start = data.rfind(b'\n', start, match.start()) + 1 or start
+        starts.append(base + line_start)
+        newline = data.find(b'\n', match.start(), end)
+        if newline < 0:
+            break
+        pos = newline + 1
+    return starts
+
+
+def grep_chunk(file_path, pattern, start, end):
+    """Ищет pattern в байтах [start, end) файла, отображенного в память; для дочернего процесса."""
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return grep_block(data, pattern, start, end)
+
+
+def grep_calls(source, pattern, ranges):
+    """Задачи поиска pattern по диапазонам, как chunk_calls для разбора."""
+    for first, last, start, end in ranges:
+        if source.compressed:
+            data = source.read(start, end)
+            yield grep_block, (data, pattern, 0, len(data), start)
+        else:
+            yield grep_chunk, (source.file_path, pattern, start, end)
+
+
+def offsets_to_rows(line_offsets, starts):
+    """Номера строк по смещениям их начала; пустые строки в индексе не хранятся и пропускаются."""
+    rows = array('i')
+    total = len(line_offsets)
+    for offset in starts:
+        row = bisect_left(line_offsets, offset)
+        if row < total and line_offsets[row] == offset:
+            rows.append(row)
+    return rows
+
+
+def grep_source(source, pattern, progress=None, workers=None):
+    """Номера строк файла с совпадением pattern порциями по возрастанию.
+
+    Проиндексированная часть файла делится на куски по GREP_CHUNK_BYTES,
+    выровненные по строкам; большой файл просматривается в пуле процессов
+    (pool_map), результаты отдаются в порядке кусков, как только готовы.
+    progress получает (байт просмотрено, всего байт); исключение из него
+    останавливает поиск.
+    """
+    line_offsets = source.line_offsets
+    ranges = split_ranges(line_offsets, source.size, GREP_CHUNK_BYTES)
+    calls = grep_calls(source, pattern, ranges)
+    if source.size < PARALLEL_MIN_BYTES or (os.cpu_count() or 1) == 1:
+        results = (function(*args) for function, args in calls)
+    else:
+        results = pool_map(calls, workers)
+    total = source.size
+    done = 0
+    with closing(results):
+        for (first, last, start, end), starts in zip(ranges, results):
+            done += end - start
+            if progress is not None:
+                progress(done, total)
+            yield offsets_to_rows(line_offsets, starts)
+
+
+def grep_store(store, pattern, progress=None):
+    """Номера записей хранилища, в сырых строках которых есть совпадение, порциями по возрастанию.
+
+    Записи не разбираются: поиск идет по байтам строк файла. У объединенного
+    вида строки файлов переставлены по времени, поэтому его результат
+    отдается одной порцией в конце.
+    """
+    source = store.source
+    if source is None:
+        return
+    if not isinstance(source, MergedLogSource):
+        yield from grep_source(source, pattern, progress)
+        return
+
+    positions = set()
+    total = source.size
+    done = 0
+    for file_source, base in zip(source.sources, source.bases):
+        def file_progress(position, size, done=done):
+            if progress is not None:
+                progress(done + position, total)
+
+        for rows in grep_source(file_source, pattern, file_progress):
+            positions.update(row + base for row in rows)
+        done += file_source.size
+    yield array('i', compress(range(len(source.order)), map(positions.__contains__, source.order)))
@@ -1,17 +1,54 @@
+import multiprocessing
+import time
+from array import array
+from bisect import bisect_left
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTextEdit, QPushButton, QFileDialog,
-    QVBoxLayout, QWidget, QLabel, QHBoxLayout, QDialog, QProgressBar, QMessageBox
+    QVBoxLayout, QWidget, QLabel, QHBoxLayout, QDialog, QProgressBar, QMessageBox,
+    QTableView, QAbstractItemView, QHeaderView, QSplitter, QLineEdit
 )
-from PyQt5.QtGui import QTextCharFormat, QColor, QTextCursor
+from PyQt5.QtGui import QTextCursor
 from PyQt5.QtCore import QThread, pyqtSignal, Qt, QTimer
-from parser import LogProcessingThread
-from utils import CustomProgressDialog, format_timestamp, parse_log
+from filters import FilterSyntaxError, compile_filter, parse_time_literal
+from grep import compile_raw_pattern
+from models import LogPalette, LogTableModel
+from parser import JobScheduler, filter_job, grep_job, index_job, merge_files_job, stream_file_job
+from records import LogStore
+from render import DetailCache, merge_parts, next_batch_size, records_parts
+from search import matches_query
+from timeline import find_time_row, wall_time_on_log_day
+from widgets import CustomProgressDialog, JsonTreeWidget, PatternsDialog, TimelineWidget
+
+LEVEL_BUTTON_COLORS = {
+    'INFO': 'green',
+    'WARNING': '#FFA500',
+    'ERROR': 'red',
+    'CRITICAL': 'magenta',
+    'DEBUG': '#00B2FF'
+}
+COLUMN_WIDTHS = {"Timestamp": 200, "Level": 100, "Source": 150, "Message": 500}
+JOB_MESSAGES = {
+    'open': "Processing log file, please wait...",
+    'index': "Parsing log records, please wait...",
+    'filter': "Filtering logs, please wait...",
+    'grep': "Searching raw log lines, please wait..."
+}
 
 class LogViewer(QMainWindow):
     def __init__(self):
         super().__init__()
         self.current_filter = None
-        self.full_logs = []
+        self.current_search = ''
+        self.current_pattern = None
+        self.store = LogStore()
+        self.palette = LogPalette()
+        self.jobs = JobScheduler(self)
+        self.max_detail_logs = 500
+        self.detail_indexes = []
+        self.detail_position = 0
+        self.detail_batch_size = 10
+        self.detail_cache = DetailCache()
         self.level_counts = {level: 0 for level in ["INFO", "WARNING", "ERROR", "CRITICAL", "DEBUG"]}
         self.initUI()
         self.center()
@@ -20,33 +57,102 @@ class LogViewer(QMainWindow):
         self.setWindowTitle('Checkbox Kasa Log Viewer v0.0.3')
         self.setGeometry(100, 100, 1200, 800)
 
+        self.log_model = LogTableModel(self.palette, self)
+        self.table_view = QTableView(self)
+        self.table_view.setModel(self.log_model)
+        self.table_view.setStyleSheet("background-color: #E0E0E0; color: #000; font-size: 12pt;")
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setWordWrap(False)
+        self.table_view.verticalHeader().hide()
+        self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table_view.verticalHeader().setDefaultSectionSize(24)
+        self.table_view.horizontalHeader().setStretchLastSection(True)
+        self.resize_columns()
+        self.table_view.selectionModel().selectionChanged.connect(self.show_selected_logs)
+        self.table_view.selectionModel().currentRowChanged.connect(self.show_current_extra)
+
         self.text_edit = QTextEdit(self)
         self.text_edit.setReadOnly(True)
+        self.text_edit.setUndoRedoEnabled(False)
         self.text_edit.setStyleSheet("background-color: #E0E0E0; color: #000; font-size: 12pt;")
 
+        self.json_tree = JsonTreeWidget(self)
+
+        self.detail_timer = QTimer(self)
+        self.detail_timer.setSingleShot(True)
+        self.detail_timer.timeout.connect(self.render_detail_batch)
+
+        detail_splitter = QSplitter(Qt.Horizontal, self)
+        detail_splitter.addWidget(self.text_edit)
+        detail_splitter.addWidget(self.json_tree)
+
+        splitter = QSplitter(Qt.Vertical, self)
+        splitter.addWidget(self.table_view)
+        splitter.addWidget(detail_splitter)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+
         self.open_file_button = self.create_button('Open Log File', self.open_file, "#4CAF50")
         self.reset_button = self.create_button('RESET', self.reset_filter, "#f44336")
+        self.follow_button = self.create_button('Follow', self.toggle_follow, "#607D8B")
+        self.follow_button.setCheckable(True)
+        self.patterns_button = self.create_button('Patterns', self.show_patterns, "#795548")
+
+        self.patterns_dialog = PatternsDialog(self)
+        self.patterns_dialog.recordSelected.connect(self.select_log)
+
+        self.follow_timer = QTimer(self)
+        self.follow_timer.setInterval(500)
+        self.follow_timer.timeout.connect(self.follow_file)
+
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText(
+            'Filter: level>=WARNING and extra.shift_id == 42 and time between 10:00..11:00 and message ~ /timeout/'
+        )
+        self.filter_edit.setStyleSheet("font-size: 12pt; padding: 5px;")
+        self.filter_edit.returnPressed.connect(self.filter_query)
+
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText('Search message and extra: words (AND), OR, "phrase"; /regex/ over raw lines')
+        self.search_edit.setStyleSheet("font-size: 12pt; padding: 5px;")
+        self.search_edit.returnPressed.connect(self.search_logs)
+
+        self.goto_edit = QLineEdit(self)
+        self.goto_edit.setPlaceholderText('Go to time: 14:32 or 2024-05-01 14:32')
+        self.goto_edit.setStyleSheet("font-size: 12pt; padding: 5px;")
+        self.goto_edit.returnPressed.connect(self.goto_time)
+
+        self.timeline = TimelineWidget(LEVEL_BUTTON_COLORS, self)
+        self.timeline.timeSelected.connect(self.jump_to_time)
+        self.timeline.buildRequested.connect(self.build_timeline)
+
+        self.progress_dialog = CustomProgressDialog("Processing", JOB_MESSAGES['open'], self)
+        self.progress_dialog.canceled.connect(self.jobs.cancel)
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setSingleShot(True)
+        self.progress_timer.setInterval(300)
+        self.progress_timer.timeout.connect(self.progress_dialog.show)
+        self.jobs.started.connect(self.job_started)
+        self.jobs.idle.connect(self.job_idle)
+        # Счетчики уровней догоняют разобранные записи, даже если задачу загрузки отменили
+        self.jobs.idle.connect(self.refresh_statistics)
+        self.jobs.progress.connect(self.job_progress)
+        self.jobs.error.connect(self.handle_error)
 
         self.stats_label = QLabel(self)
         self.stats_label.setStyleSheet("font-size: 16px; padding: 5px;")
         self.update_statistics()
 
-        button_colors = {
-            'INFO': 'green',
-            'WARNING': '#FFA500',
-            'ERROR': 'red',
-            'CRITICAL': 'magenta',
-            'DEBUG': '#00B2FF'
-        }
-
         filter_buttons = {
             level: self.create_button(level, lambda _, lvl=level: self.filter_logs(lvl), color)
-            for level, color in button_colors.items()
+            for level, color in LEVEL_BUTTON_COLORS.items()
         }
 
         file_layout = QVBoxLayout()
         file_layout.addWidget(self.open_file_button)
         file_layout.addWidget(self.reset_button)
+        file_layout.addWidget(self.follow_button)
+        file_layout.addWidget(self.patterns_button)
 
         filter_layout = QHBoxLayout()
         filter_layout.setSpacing(10)
@@ -64,12 +170,21 @@ class LogViewer(QMainWindow):
 
         main_layout = QVBoxLayout()
         main_layout.addLayout(h_layout)
-        main_layout.addWidget(self.text_edit)
+        main_layout.addWidget(self.filter_edit)
+        main_layout.addWidget(self.search_edit)
+        main_layout.addWidget(self.goto_edit)
+        main_layout.addWidget(self.timeline)
+        main_layout.addWidget(splitter)
 
         container = QWidget()
         container.setLayout(main_layout)
         self.setCentralWidget(container)
 
+    def resize_columns(self):
+        for column, name in enumerate(self.log_model.columns):
+            if name in COLUMN_WIDTHS:
+                self.table_view.setColumnWidth(column, COLUMN_WIDTHS[name])
+
     def create_button(self, text, handler, color):
         button = QPushButton(text, self)
         button.setStyleSheet(f"background-color: {color}; color: white; font-size: 14pt; padding: 5px; border-radius: 5px;")
@@ -77,176 +192,348 @@ class LogViewer(QMainWindow):
         return button
 
     def open_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select Log File", "", "Log Files (*.log)")
-        if file_path:
-            self.show_progress_dialog()
-            self.thread = LogProcessingThread(file_path)
-            self.thread.progress.connect(self.update_progress)
-            self.thread.finished.connect(self.finish_processing)
-            self.thread.error.connect(self.handle_error)
-            self.thread.start()
-
-    def show_progress_dialog(self):
-        self.progress_dialog = CustomProgressDialog("Processing", "Processing log file, please wait...", self)
-        self.progress_dialog.show()
-        QApplication.processEvents()
-
-    def hide_progress_dialog(self):
-        if hasattr(self, 'progress_dialog') and self.progress_dialog:
-            self.progress_dialog.hide()
-
-    def update_progress(self, value):
-        if hasattr(self, 'progress_dialog') and self.progress_dialog:
-            self.progress_dialog.progress_bar.setValue(value)
-
-    def finish_processing(self):
-        self.hide_progress_dialog()
-        self.show_update_progress_dialog()
-        self.process_logs()
-
-    def show_update_progress_dialog(self):
-        self.update_progress_dialog = CustomProgressDialog("Updating Display", "Updating log display, please wait...", self)
-        self.update_progress_dialog.show()
-        QApplication.processEvents()
-
-    def hide_update_progress_dialog(self):
-        if hasattr(self, 'update_progress_dialog') and self.update_progress_dialog:
-            self.update_progress_dialog.hide()
-
-    def process_logs(self):
-        self.text_edit.clear()
-        self.full_logs.clear()
-        self.reset_statistics()  # Сброс статистики перед подсчетом
-
-        total_logs = len(self.thread.logs)
-        self.current_log_index = 0
-        self.total_logs = total_logs
-
-        self.full_logs = self.thread.logs.copy()
-
-        self.process_next_batch()
-
-    def process_next_batch(self):
-        if self.current_log_index >= self.total_logs:
-            self.hide_update_progress_dialog()
-            self.update_statistics()
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Log Files", "", "Log Files (*.log *.log.* *.gz *.xz *.zst);;All Files (*)")
+        if len(file_paths) == 1:
+            self.load_file(file_paths[0])
+        elif file_paths:
+            self.load_files(file_paths)
+
+    def load_file(self, file_path):
+        """Открывает файл: первые строки видны сразу, остальные дочитываются и разбираются в фоне."""
+        self.jobs.cancel()
+        self.jobs.submit('stream', stream_file_job, (file_path,), self.finish_loading, self.show_loaded)
+
+    def load_files(self, file_paths):
+        """Открывает несколько файлов одним видом, упорядоченным по времени."""
+        self.jobs.cancel()
+        self.jobs.submit('open', merge_files_job, (file_paths,), self.process_logs)
+
+    def toggle_follow(self, checked):
+        if checked:
+            self.follow_button.setText('Following')
+            self.follow_timer.start()
+        else:
+            self.follow_button.setText('Follow')
+            self.follow_timer.stop()
+
+    def follow_file(self):
+        """Дочитывает строки, дописанные в открытый файл; при ротации или усечении открывает его заново."""
+        if self.store.source is None or self.jobs.is_busy():
             return
 
-        batch_size = 10
-        end_index = min(self.current_log_index + batch_size, self.total_logs)
-
-        for idx in range(self.current_log_index, end_index):
-            log_parts, level = self.thread.logs[idx]
-            if not self.current_filter or level == self.current_filter:
-                self.append_log_parts(log_parts)
-
-            if level in self.level_counts:
-                self.level_counts[level] += 1
-
-        self.update_progress_dialog.progress_bar.setValue(int(((end_index) / self.total_logs) * 100))
-
-        self.current_log_index = end_index
-
-        QTimer.singleShot(0, self.process_next_batch)
+        first = len(self.store)
+        added = self.store.source.refresh()
+        if added is None:
+            self.load_file(self.store.source.file_path)
+            return
+        if not added:
+            return
 
-    def append_log_parts(self, log_parts):
-        cursor = self.text_edit.textCursor()
-        for text, fg_color, bg_color in log_parts:
-            cursor.movePosition(QTextCursor.End)
-            char_format = self.create_char_format(fg_color, bg_color)
-            cursor.insertText(text, char_format)
-        cursor.insertText("\n" + "-"*80 + "\n", self.create_char_format(QColor('black'), QColor('#E0E0E0')))
-        self.text_edit.verticalScrollBar().setValue(self.text_edit.verticalScrollBar().maximum())
+        self.store.append_rows(added)
+        if self.store.indexed_count == first:
+            self.store.parse_range(first, len(self.store))
+            self.store.extend_index(len(self.store))
+
+        scroll_bar = self.table_view.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        self.append_new_logs(first)
+        if at_bottom:
+            self.table_view.scrollToBottom()
+        self.refresh_statistics()
+        self.timeline.refresh(self.store)
+        self.refresh_patterns()
+
+    def append_new_logs(self, first):
+        if self.current_filter is None and not self.current_search:
+            self.log_model.append_rows()
+            return
+        if not self.store.is_indexed():
+            return
 
-    def filter_logs(self, level):
-        if not self.full_logs:
+        rows = range(first, len(self.store))
+        if self.current_pattern is not None:
+            rows = [idx for idx in rows if self.current_pattern.search(self.store.source.line(idx))]
+        elif self.current_search:
+            rows = [idx for idx in rows if matches_query(self.current_search, self.store.row_text(idx))]
+        if self.current_filter is not None:
+            rows = self.current_filter.rows(self.store, rows)
+        self.log_model.append_rows(rows)
+
+    def job_started(self, key):
+        """Окно прогресса появляется, только если задача идет дольше progress_timer.
+
+        Потоковая загрузка идет без окна: ее ход виден по таблице и счетчикам.
+        """
+        if key not in JOB_MESSAGES:
+            self.job_idle()
+            return
+        self.progress_dialog.label.setText(JOB_MESSAGES[key])
+        self.progress_dialog.progress_bar.setValue(0)
+        if not self.progress_dialog.isVisible():
+            self.progress_timer.start()
+
+    def job_progress(self, value):
+        self.progress_dialog.progress_bar.setValue(value)
+        if self.jobs.running_key() == 'stream':
+            self.refresh_statistics()
+            self.timeline.refresh(self.store)
+            self.refresh_patterns()
+
+    def job_idle(self):
+        self.progress_timer.stop()
+        self.progress_dialog.hide()
+
+    def show_loaded(self, loaded):
+        """Промежуточный результат загрузки: хранилище с первыми строками, затем число строк в нем."""
+        if isinstance(loaded, LogStore):
+            self.process_logs(loaded)
+            return
+        self.append_new_logs(self.log_model.row_count)
+        self.refresh_statistics()
+
+    def finish_loading(self, result):
+        self.refresh_statistics()
+        self.timeline.refresh(self.store)
+        self.refresh_patterns()
+
+    def process_logs(self, store):
+        # Задачи из очереди относятся к прежнему хранилищу
+        self.jobs.cancel_pending()
+        self.clear_details()
+        self.detail_cache.clear()
+        self.json_tree.clear()
+        self.store.close()
+
+        self.store = store
+        self.log_model.set_store(self.store)
+        self.resize_columns()
+        self.timeline.reset()
+        self.patterns_dialog.reset()
+        self.apply_filter()
+        self.refresh_statistics()
+        self.timeline.refresh(self.store)
+        self.refresh_patterns()
+
+    def apply_filter(self):
+        """Фильтрует в фоне; новый фильтр отменяет еще не завершенный прежний.
+
+        Поиск /regex/ идет по сырым строкам файла, найденные записи
+        добавляются в таблицу по мере просмотра.
+        """
+        if self.current_pattern is not None:
+            self.jobs.cancel('filter')
+            self.log_model.set_rows(array('i'))
+            self.jobs.submit(
+                'grep', grep_job, (self.store, self.current_pattern, self.current_filter),
+                self.finish_grep, self.log_model.append_rows
+            )
+        elif self.current_filter is None and not self.current_search:
+            self.jobs.cancel('filter')
+            self.jobs.cancel('grep')
+            self.log_model.set_rows(None)
+        else:
+            self.jobs.cancel('grep')
+            self.jobs.submit(
+                'filter', filter_job, (self.store, self.current_search, self.current_filter), self.show_filtered
+            )
+
+    def show_filtered(self, rows):
+        self.log_model.set_rows(rows)
+        self.refresh_statistics()
+        self.timeline.refresh(self.store)
+
+    def finish_grep(self, result):
+        self.refresh_statistics()
+        self.timeline.refresh(self.store)
+
+    def parse_logs(self, callback):
+        """Разбирает все записи и строит индекс уровней в фоне, затем вызывает callback."""
+        self.jobs.submit('index', index_job, (self.store,), lambda result: self.finish_parsing(callback))
+
+    def finish_parsing(self, callback):
+        self.refresh_statistics()
+        self.timeline.refresh(self.store)
+        self.refresh_patterns()
+        callback()
+
+    def show_patterns(self):
+        """Открывает вид шаблонов; шаблоны собираются при разборе, поэтому сначала записи разбираются."""
+        if not len(self.store):
+            QMessageBox.warning(self, "No Logs Loaded", "No logs have been loaded. Please open a log file first.")
+            return
+        self.patterns_dialog.show()
+        self.patterns_dialog.raise_()
+        self.refresh_patterns()
+        if not self.store.is_indexed() and not self.jobs.is_busy():
+            self.parse_logs(lambda: None)
+
+    def refresh_patterns(self):
+        if self.patterns_dialog.isVisible():
+            self.patterns_dialog.refresh(self.store)
+
+    def build_timeline(self):
+        if len(self.store) and not self.store.is_indexed() and not self.jobs.is_busy():
+            self.parse_logs(lambda: None)
+
+    def goto_time(self):
+        if not len(self.store):
             QMessageBox.warning(self, "No Logs Loaded", "No logs have been loaded. Please open a log file first.")
             return
+        if not self.store.is_indexed():
+            self.parse_logs(self.goto_time)
+            return
 
-        self.current_filter = level
-        self.reset_statistics()  # Сброс статистики перед применением фильтра
-        self.show_filter_progress_dialog()
+        try:
+            start, span, absolute = parse_time_literal(self.goto_edit.text())
+        except FilterSyntaxError as e:
+            QMessageBox.warning(self, "Invalid Time", str(e))
+            return
+        wall_time = start if absolute else wall_time_on_log_day(self.store, start, span)
+        if wall_time is not None:
+            self.jump_to_time(wall_time)
+
+    def jump_to_time(self, wall_time):
+        """Выделяет первую видимую запись с местным временем не раньше wall_time."""
+        if not self.store.is_indexed():
+            self.parse_logs(lambda: self.jump_to_time(wall_time))
+            return
+        rows = self.log_model.rows
+        row = find_time_row(self.store, wall_time, rows, self.log_model.row_count if rows is not None else None)
+        if row is None:
+            QMessageBox.information(self, "Go to Time", "No records at or after this time.")
+            return
+        self.select_row(row)
+
+    def select_log(self, idx):
+        """Выделяет запись idx хранилища, если она видна при текущем фильтре."""
+        rows = self.log_model.rows
+        row = idx if rows is None else bisect_left(rows, idx, 0, self.log_model.row_count)
+        if row >= self.log_model.row_count or (rows is not None and rows[row] != idx):
+            QMessageBox.information(self, "Select Record", "The record is hidden by the current filter or search.")
+            return
+        self.select_row(row)
+
+    def select_row(self, row):
+        index = self.log_model.index(row, 0)
+        self.table_view.scrollTo(index, QAbstractItemView.PositionAtTop)
+        self.table_view.selectRow(row)
+
+    def selected_log_indexes(self, limit):
+        """Возвращает индексы выделенных записей (не больше limit) по диапазонам выделения."""
+        indexes = []
+        for selection_range in self.table_view.selectionModel().selection():
+            for row in range(selection_range.top(), selection_range.bottom() + 1):
+                indexes.append(self.log_model.log_index(row))
+                if len(indexes) >= limit:
+                    return sorted(indexes)
+        return sorted(indexes)
+
+    def show_selected_logs(self):
+        self.clear_details()
+        self.detail_indexes = self.selected_log_indexes(self.max_detail_logs)
+        self.render_detail_batch()
+
+    def clear_details(self):
+        self.detail_timer.stop()
+        self.detail_indexes = []
+        self.detail_position = 0
         self.text_edit.clear()
 
-        self.current_log_index = 0
-        self.total_logs = len(self.full_logs)
-
-        QTimer.singleShot(0, self.process_filtered_logs)
-
-    def show_filter_progress_dialog(self):
-        self.filter_progress_dialog = CustomProgressDialog("Filtering Logs", "Filtering logs, please wait...", self)
-        self.filter_progress_dialog.show()
-        QApplication.processEvents()
-
-    def hide_filter_progress_dialog(self):
-        if hasattr(self, 'filter_progress_dialog') and self.filter_progress_dialog:
-            self.filter_progress_dialog.hide()
-
-    def process_filtered_logs(self):
-        if self.current_log_index >= self.total_logs:
-            self.hide_filter_progress_dialog()
-            self.update_statistics()
+    def show_current_extra(self, current):
+        """Дерево extra строится для текущей записи только при ее выборе."""
+        if current.isValid():
+            self.json_tree.show_value(self.store.extra(self.log_model.log_index(current.row())))
+        else:
+            self.json_tree.clear()
+
+    def render_detail_batch(self):
+        """Выводит следующую пачку выделенных записей одним блоком правки документа.
+
+        Размер пачки подстраивается под бюджет кадра, остальные записи
+        выводятся следующими пачками через таймер, не блокируя интерфейс.
+        """
+        start = time.perf_counter()
+        first = self.detail_position
+        indexes = self.detail_indexes[first:first + self.detail_batch_size]
+        if not indexes:
             return
+        self.append_log_parts(records_parts(self.store, indexes, self.detail_cache))
+        self.detail_position += len(indexes)
+        if not first:
+            self.text_edit.moveCursor(QTextCursor.Start)
+        self.detail_batch_size = next_batch_size(len(indexes), time.perf_counter() - start)
+        if self.detail_position < len(self.detail_indexes):
+            self.detail_timer.start(0)
 
-        batch_size = 10
-        end_index = min(self.current_log_index + batch_size, self.total_logs)
+    def append_log_parts(self, log_parts):
+        """Вставляет фрагменты в конец документа; раскладка пересчитывается один раз после блока."""
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        for text, style in merge_parts(log_parts):
+            cursor.insertText(text, self.palette.char_format(style))
+        cursor.endEditBlock()
 
-        for idx in range(self.current_log_index, end_index):
-            log_parts, level = self.full_logs[idx]
-            if self.current_filter is None or level == self.current_filter:
-                self.append_log_parts(log_parts)
+    def filter_logs(self, level):
+        self.filter_edit.setText(f"level == {level}")
+        self.filter_query()
 
-            if level in self.level_counts:
-                self.level_counts[level] += 1
+    def filter_query(self):
+        if not len(self.store):
+            QMessageBox.warning(self, "No Logs Loaded", "No logs have been loaded. Please open a log file first.")
+            return
 
-        self.filter_progress_dialog.progress_bar.setValue(int(((end_index) / self.total_logs) * 100))
+        text = self.filter_edit.text().strip()
+        try:
+            self.current_filter = compile_filter(text) if text else None
+        except FilterSyntaxError as e:
+            QMessageBox.warning(self, "Invalid Filter", str(e))
+            return
+        self.apply_filter()
 
-        self.current_log_index = end_index
+    def search_logs(self):
+        if not len(self.store):
+            QMessageBox.warning(self, "No Logs Loaded", "No logs have been loaded. Please open a log file first.")
+            return
 
-        QTimer.singleShot(0, self.process_filtered_logs)
+        text = self.search_edit.text().strip()
+        try:
+            self.current_pattern = compile_raw_pattern(text)
+        except FilterSyntaxError as e:
+            QMessageBox.warning(self, "Invalid Search", str(e))
+            return
+        self.current_search = text
+        self.apply_filter()
 
     def reset_filter(self):
-        if not self.full_logs:
+        if not len(self.store):
             QMessageBox.warning(self, "No Logs Loaded", "No logs have been loaded. Please open a log file first.")
             return
 
         self.current_filter = None
-        self.reset_statistics()  # Сброс статистики при сбросе фильтра
-        self.show_filter_progress_dialog()
-        self.text_edit.clear()
-
-        self.current_log_index = 0
-        self.total_logs = len(self.full_logs)
-
-        QTimer.singleShot(0, self.process_filtered_logs)
+        self.current_search = ''
+        self.current_pattern = None
+        self.filter_edit.clear()
+        self.search_edit.clear()
+        self.apply_filter()
 
     def reset_statistics(self):
         """Сбрасывает счетчики статистики логов."""
         self.level_counts = {level: 0 for level in ["INFO", "WARNING", "ERROR", "CRITICAL", "DEBUG"]}
 
-    def update_statistics(self):
-        button_colors = {
-            'INFO': 'green',
-            'WARNING': '#FFA500',
-            'ERROR': 'red',
-            'CRITICAL': 'magenta',
-            'DEBUG': '#00B2FF'
-        }
+    def refresh_statistics(self):
+        self.reset_statistics()  # Сброс статистики перед подсчетом
+        for level, count in self.store.level_counts().items():
+            if level in self.level_counts:
+                self.level_counts[level] = count
+        self.update_statistics()
 
-        stats_text = "\n".join(f"<span style='color: {button_colors[level]};'>{level}: {count}</span>" for level, count in self.level_counts.items())
+    def update_statistics(self):
+        stats_text = "\n".join(f"<span style='color: {LEVEL_BUTTON_COLORS[level]};'>{level}: {count}</span>" for level, count in self.level_counts.items())
+        if not self.store.is_parsed():
+            stats_text += f"<br>Parsed: {self.store.parsed_count} of {len(self.store)}"
         self.stats_label.setText(f"Log Levels Count:<br>{stats_text}")
 
-    def create_char_format(self, fg_color, bg_color):
-        char_format = QTextCharFormat()
-        char_format.setForeground(fg_color)
-        char_format.setBackground(bg_color)
-
-        font = char_format.font()
-        font.setPointSize(12)
-        char_format.setFont(font)
-
-        return char_format
-
     def center(self):
         screen = QApplication.primaryScreen()
         screen_geometry = screen.geometry()
@@ -255,10 +542,15 @@ class LogViewer(QMainWindow):
         y = (screen_geometry.height() - window_geometry.height()) // 2
         self.setGeometry(x, y, window_geometry.width(), window_geometry.height())
 
+    def closeEvent(self, event):
+        self.jobs.shutdown()
+        super().closeEvent(event)
+
     def handle_error(self, error_message):
         QMessageBox.critical(self, "Error", f"An error occurred: {error_message}")
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication([])
     viewer = LogViewer()
     viewer.show()
@@ -0,0 +1,200 @@
+import mmap
+import os
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from contextlib import closing
+
+from patterns import TemplateMiner
+from search import pack_postings, record_text, tokenize
+from utils import parse_log
+
+CHUNK_BYTES = 16 * 1024 * 1024
+PARALLEL_MIN_LINES = 200000
+
+
+class ProgressThrottle:
+    """Передает прогресс в callback не чаще max_rate раз в секунду и только при смене процента."""
+
+    def __init__(self, callback, max_rate=20):
+        self.callback = callback
+        self.interval = 1.0 / max_rate
+        self.last_time = 0.0
+        self.last_value = -1
+
+    def update(self, position, total):
+        value = int(position / total * 100) if total else 100
+        now = time.monotonic()
+        if value != self.last_value and (value == 100 or now - self.last_time >= self.interval):
+            self.last_time = now
+            self.last_value = value
+            self.callback(value)
+
+
+def split_ranges(line_offsets, file_size, chunk_bytes=CHUNK_BYTES, first=0):
+    """Делит файл со строки first на диапазоны (первая строка, последняя строка, начало, конец) по границам строк."""
+    ranges = []
+    total = len(line_offsets)
+    while first < total:
+        start = line_offsets[first]
+        last = max(bisect_left(line_offsets, start + chunk_bytes), first + 1)
+        end = line_offsets[last] if last < total else file_size
+        ranges.append((first, last, start, end))
+        first = last
+    return ranges
+
+
+def parse_chunk(file_path, first, start, end):
+    """Разбирает непустые строки в байтах [start, end) файла, first - номер первой строки."""
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_block(data[start:end], first)
+
+
+def parse_block(data, first):
+    """Разбирает непустые строки блока байт, first - номер первой строки.
+
+    Выполняется в дочернем процессе, поэтому возвращает только
+    сериализуемые данные без объектов Qt: (имена уровней, коды уровней,
+    время, смещения пояса, упакованный индекс текста, сводка шаблонов сообщений).
+    """
+    postings = {}
+    patterns = TemplateMiner()
+    row = first
+    level_names = []
+    level_codes = {}
+    levels = array('B')
+    timestamps = array('q')
+    utc_offsets = array('h')
+
+    for line in data.split(b'\n'):
+        if not line.strip():
+            continue
+        level, timestamp, utc_offset, message, extra = parse_log(line.rstrip(b'\r'))
+        code = level_codes.get(level)
+        if code is None:
+            code = level_codes[level] = len(level_names)
+            level_names.append(level)
+        levels.append(code)
+        timestamps.append(timestamp)
+        utc_offsets.append(utc_offset)
+        patterns.add(message, level, timestamp, utc_offset)
+        for token in set(tokenize(record_text(message, extra))):
+            rows = postings.get(token)
+            if rows is None:
+                postings[token] = [row]
+            else:
+                rows.append(row)
+        row += 1
+
+    return level_names, levels.tobytes(), timestamps, utc_offsets, pack_postings(postings), patterns.summary()
+
+
+def parse_serial(store, progress=None, batch_size=4096):
+    """Разбирает файл хранилища в текущем потоке и строит индексы уровней и текста.
+
+    progress получает (байт прочитано, всего байт).
+    """
+    source = store.source
+    total = len(store)
+    for start in range(store.indexed_count, total, batch_size):
+        stop = min(start + batch_size, total)
+        store.parse_range(start, stop)
+        store.extend_index(stop)
+        if progress is not None:
+            position = source.line_offsets[stop] if stop < total else source.size
+            progress(position, source.size)
+
+
+def bounded_map(executor, calls, window):
+    """Как executor.map для пар (функция, аргументы), которые берутся лениво; в работе не больше window задач."""
+    pending = deque()
+    for function, args in calls:
+        pending.append(executor.submit(function, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def pool_map(calls, workers=None):
+    """Результаты задач (функция, аргументы) в пуле из workers процессов, по порядку задач.
+
+    В работе не больше двух задач на процесс. Если генератор закрыт или
+    прерван исключением, еще не начатые задачи пула отменяются.
+    """
+    # Пул процессов нужен только здесь, а его импорт - заметная часть холодного старта
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            yield from bounded_map(executor, calls, 2 * workers)
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
+def chunk_calls(tasks):
+    """Задачи разбора диапазонов: обычный файл процессы читают сами, сжатый распаковывается здесь."""
+    for store, first, last, start, end in tasks:
+        source = store.source
+        if source.compressed:
+            yield parse_block, (source.read(start, end), first)
+        else:
+            yield parse_chunk, (source.file_path, first, start, end)
+
+
+def parse_parallel(store, workers=None, progress=None):
+    """Разбирает весь файл хранилища в пуле процессов и строит индексы уровней и текста.
+
+    progress получает (байт разобрано, всего байт).
+    """
+    parse_many([store], workers, progress)
+
+
+def parse_many(stores, workers=None, progress=None):
+    """Разбирает файлы нескольких хранилищ в одном пуле процессов.
+
+    Результаты забираются в порядке строк каждого файла, поэтому индексы
+    дописываются по мере их поступления, а прерванный разбор продолжается
+    с первой непроиндексированной строки. progress получает (байт разобрано,
+    всего байт по всем файлам); исключение из него останавливает разбор.
+    """
+    tasks = [
+        (store, first, last, start, end)
+        for store in stores
+        for first, last, start, end in split_ranges(
+            store.source.line_offsets, store.source.size, first=store.indexed_count
+        )
+    ]
+    total = sum(end - start for store, first, last, start, end in tasks)
+    done = 0
+    with closing(pool_map(chunk_calls(tasks), workers)) as results:
+        for (store, first, last, start, end), result in zip(tasks, results):
+            store.set_batch(first, *result)
+            store.extend_index(last)
+            done += end - start
+            if progress is not None:
+                progress(done, total)
+
+
+def should_parse_parallel(store):
+    return len(store) >= PARALLEL_MIN_LINES and (os.cpu_count() or 1) > 1
+
+
+def parse_stores(stores, progress=None):
+    """Разбирает еще не проиндексированные хранилища: в пуле процессов, если строк много, иначе по очереди."""
+    stores = [store for store in stores if not store.is_indexed()]
+    if sum(map(len, stores)) >= PARALLEL_MIN_LINES and (os.cpu_count() or 1) > 1:
+        parse_many(stores, progress=progress)
+        return
+
+    total = sum(store.source.size for store in stores)
+    done = 0
+    for store in stores:
+        if progress is None:
+            parse_serial(store)
+        else:
+            parse_serial(store, lambda position, size: progress(done + position, total))
+        done += store.source.size
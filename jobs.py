@@ -0,0 +1,46 @@
+import threading
+
+
+class Cancelled(Exception):
+    """Фоновая задача отменена."""
+
+
+class CancelToken:
+    """Флаг отмены фоновой задачи.
+
+    Задача проверяет его между порциями работы (обычно в callback
+    прогресса) и прерывается исключением Cancelled; уже сделанная работа,
+    например проиндексированные строки, остается и продолжается следующей задачей.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled()
+
+
+CHECK_ROWS = 4096
+
+
+def checkpoints(rows, progress=None):
+    """Перебирает rows, вызывая progress(позиция, всего) каждые CHECK_ROWS строк.
+
+    progress задачи проверяет отмену, так что долгий проход по строкам
+    (полный просмотр фильтра, проверка фраз) прерывается исключением Cancelled.
+    """
+    if progress is None:
+        yield from rows
+        return
+    total = len(rows)
+    for position, row in enumerate(rows):
+        if not position % CHECK_ROWS:
+            progress(position, total)
+        yield row
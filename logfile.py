@@ -0,0 +1,469 @@
+import lzma
+import mmap
+import os
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate, compress, repeat
+from operator import add
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 16 * 1024 * 1024
+READ_SIZE = 64 * 1024
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+FIRST_STEP_BYTES = 256 * 1024
+# Предел памяти под пересжатые участки xz и zstd; дальше участки распаковываются заново из файла
+RECOMPRESSED_BYTES = 256 * 1024 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def index_lines(data, start=0, end=None, chunk_size=CHUNK_SIZE, base=0):
+    """Возвращает array('Q') смещений начала непустых строк в data[start:end], сдвинутых на base.
+
+    Строки только из пробелов и \r тоже считаются пустыми. Строки режутся кусками по chunk_size, выровненными по переводу строки,
+    поэтому весь проход выполняется в C (split/accumulate/compress).
+    """
+    end = len(data) if end is None else end
+    offsets = array('Q')
+    pos = start
+    while pos < end:
+        chunk_end = min(pos + chunk_size, end)
+        if chunk_end < end:
+            newline = data.rfind(b'\n', pos, chunk_end)
+            if newline < 0:
+                newline = data.find(b'\n', chunk_end, end)
+            chunk_end = end if newline < 0 else newline + 1
+
+        lines = data[pos:chunk_end].split(b'\n')
+        starts = accumulate(map(add, map(len, lines), repeat(1)), initial=base + pos)
+        offsets.extend(compress(starts, map(bytes.strip, lines)))
+        pos = chunk_end
+    return offsets
+
+
+def map_file(file):
+    size = os.fstat(file.fileno()).st_size
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+
+class LogFile:
+    """Лог-файл, отображенный в память, с индексом смещений строк.
+
+    size - число байт, покрытых индексом: конец последней полной строки.
+    Строка без перевода строки в конце файла обычно еще дописывается,
+    поэтому она не индексируется и попадает в индекс при refresh(), когда
+    дописан ее перевод строки. Готовый индекс (из кэша) передается в
+    line_offsets и size, тогда файл не сканируется.
+    """
+
+    compressed = False
+
+    def __init__(self, file_path, line_offsets=None, size=None):
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        self.data = map_file(self.file)
+        if line_offsets is None:
+            self.size = self.data.rfind(b'\n') + 1
+            self.line_offsets = index_lines(self.data, 0, self.size)
+        else:
+            self.size = size
+            self.line_offsets = line_offsets
+
+    def refresh(self):
+        """Индексирует строки, дописанные в файл с прошлого раза.
+
+        Возвращает число новых строк или None, если файл был ротирован,
+        усечен или переписан (перед size больше нет перевода строки) и его
+        нужно открыть заново. Незавершенная последняя строка ждет своего
+        перевода строки.
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != os.fstat(self.file.fileno()).st_ino or stat.st_size < self.size:
+            return None
+        if stat.st_size == self.size:
+            return 0
+        if self.size and self.data[self.size - 1:self.size] != b'\n':
+            return None
+
+        data = map_file(self.file)
+        end = data.rfind(b'\n', self.size) + 1
+        if end <= self.size:
+            return 0
+        offsets = index_lines(data, self.size, end)
+        self.data = data
+        self.size = end
+        self.line_offsets.extend(offsets)
+        return len(offsets)
+
+    def scan_steps(self, progress=None):
+        """Индексирует строки после size порциями, отдавая после каждой число новых строк.
+
+        Первая порция маленькая, чтобы первые строки появились сразу, дальше
+        порции растут вдвое до CHUNK_SIZE. progress получает (байт проиндексировано, всего байт).
+        Незавершенная последняя строка не индексируется.
+        """
+        end = self.data.rfind(b'\n') + 1
+        step = FIRST_STEP_BYTES
+        while self.size < end:
+            step_end = self.size + step
+            if step_end < end:
+                newline = self.data.find(b'\n', step_end)
+                step_end = end if newline < 0 else newline + 1
+            else:
+                step_end = end
+            offsets = index_lines(self.data, self.size, step_end)
+            self.line_offsets.extend(offsets)
+            self.size = step_end
+            step = min(step * 2, CHUNK_SIZE)
+            if progress is not None:
+                progress(self.size, end)
+            yield len(offsets)
+
+    def __len__(self):
+        return len(self.line_offsets)
+
+    def line(self, idx):
+        start = self.line_offsets[idx]
+        end = self.data.find(b'\n', start)
+        if end < 0:
+            end = self.size
+        return self.data[start:end].rstrip(b'\r')
+
+    def read(self, start, end):
+        return self.data[start:end]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+def gzip_decompressor():
+    return zlib.decompressobj(wbits=31)
+
+
+def zstd_decompressor():
+    if zstandard is None:
+        raise ValueError("Reading .zst logs requires the zstandard package")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+DECOMPRESSORS = {
+    GZIP_MAGIC: gzip_decompressor,
+    XZ_MAGIC: lzma.LZMADecompressor,
+    ZSTD_MAGIC: zstd_decompressor,
+}
+
+
+def find_decompressor(file_path):
+    with open(file_path, 'rb') as f:
+        magic = f.read(6)
+    for prefix, decompressor in DECOMPRESSORS.items():
+        if magic.startswith(prefix):
+            return decompressor
+    return None
+
+
+def decompress(decompressor, new_decompressor, data, streams=None):
+    """Распаковывает data, переходя к следующему потоку в конце текущего; возвращает (куски, декомпрессор).
+
+    В streams, если он задан, дописываются начала новых потоков: (смещение
+    в data, число байт, распакованных из data до него).
+    """
+    pieces = []
+    size = len(data)
+    produced = 0
+    while data:
+        piece = decompressor.decompress(data)
+        pieces.append(piece)
+        produced += len(piece)
+        if not decompressor.eof:
+            break
+        data = decompressor.unused_data.lstrip(b'\0')
+        decompressor = new_decompressor()
+        if streams is not None:
+            streams.append((size - len(data), produced))
+    return pieces, decompressor
+
+
+def iter_lines(file_path):
+    """Непустые строки лога (в том числе сжатого) по одной, без индекса и без чтения файла целиком."""
+    new_decompressor = find_decompressor(file_path)
+    with open(file_path, 'rb') as f:
+        if new_decompressor is None:
+            for line in f:
+                if line.strip():
+                    yield line.rstrip(b'\r\n')
+            return
+
+        decompressor = new_decompressor()
+        tail = b''
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            pieces, decompressor = decompress(decompressor, new_decompressor, data)
+            for piece in pieces:
+                lines = (tail + piece).split(b'\n')
+                tail = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield line.rstrip(b'\r')
+        if tail.strip():
+            yield tail.rstrip(b'\r')
+
+
+def open_log(file_path, progress=None, scan=True):
+    """Открывает лог; сжатые gzip, xz и zstd файлы распознаются по сигнатуре.
+
+    progress получает (байт сжатого файла прочитано, всего байт) при индексации сжатого файла.
+    При scan=False строки не индексируются: индекс строит по порциям scan_steps().
+    """
+    decompressor = find_decompressor(file_path)
+    if decompressor is None:
+        return LogFile(file_path) if scan else LogFile(file_path, array('Q'), 0)
+    return CompressedLogFile(file_path, decompressor, progress, scan=scan)
+
+
+class CompressedLogFile:
+    """Сжатый лог (.gz, .xz, .zst) с индексом строк по распакованным смещениям.
+
+    Файл один раз распаковывается потоком при открытии, на диск ничего не
+    пишется. Каждые CHECKPOINT_BYTES распакованных данных запоминается
+    точка входа: для gzip - копия состояния zlib и позиция в сжатом файле.
+    Состояние xz и zstd не копируется, поэтому их участки держатся в памяти
+    пересжатыми zlib с уровнем 1, пока их общий размер не превысит
+    RECOMPRESSED_BYTES; дальше точка входа - только начало ближайшего
+    потока (кадра) в сжатом файле, и участок распаковывается заново с него.
+    Для одного потока (обычный xz или zstd) это значит распаковку с начала
+    файла, поэтому последнее состояние распаковки запоминается и следующий
+    по порядку участок (разбор, поиск) продолжает с него. Для произвольного
+    доступа распаковывается только участок с нужной строкой, последние
+    участки держатся в LRU. Склеенные потоки (cat a.gz b.gz) читаются
+    подряд. При scan=False файл распаковывается по мере прохода по scan_steps().
+    """
+
+    compressed = True
+
+    def __init__(self, file_path, decompressor, progress=None, cached_chunks=4, scan=True):
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        self.new_decompressor = decompressor
+        self.compressed_size = os.fstat(self.file.fileno()).st_size
+        self.checkpoint_starts = array('Q')
+        self.checkpoints = []
+        self.line_offsets = array('Q')
+        self.size = 0
+        self.chunks = OrderedDict()
+        self.cached_chunks = cached_chunks
+        self.recompressed_bytes = 0
+        self.cursor = None
+        self.lock = threading.Lock()
+        if scan:
+            try:
+                self.scan(progress)
+            except BaseException:
+                self.file.close()
+                raise
+
+    def add_checkpoint(self, start, compressed_pos, position, state, block):
+        """Точка входа участка с распакованной позиции start.
+
+        Участок берется из block (пересжатого zlib) или распаковывается из
+        файла с compressed_pos, где распаковано position байт, с состоянием
+        state (или с начала потока, если state нет).
+        """
+        self.checkpoint_starts.append(start)
+        self.checkpoints.append((compressed_pos, position, state, block))
+        if block is not None:
+            self.recompressed_bytes += len(block)
+
+    def scan(self, progress=None):
+        for added in self.scan_steps(progress):
+            pass
+
+    def publish(self, offsets, size):
+        """Делает доступными строки offsets, целиком лежащие в распакованных участках до size."""
+        with self.lock:
+            self.line_offsets.extend(offsets)
+            self.size = size
+        count = len(offsets)
+        del offsets[:]
+        return count
+
+    def scan_steps(self, progress=None):
+        """Распаковывает файл потоком, отдавая после каждой точки входа число новых строк.
+
+        Строки попадают в индекс только после того, как их участок
+        завершен, поэтому уже отданные строки можно читать, пока файл
+        распаковывается дальше. Файл читается своим дескриптором, чтобы не
+        мешать чтению строк. Первая точка входа ставится через
+        FIRST_STEP_BYTES, чтобы первые строки появились сразу.
+        """
+        with open(self.file_path, 'rb') as file:
+            decompressor = self.new_decompressor()
+            copyable = hasattr(decompressor, 'copy')
+            position = 0
+            compressed_pos = 0
+            interval_start = 0
+            interval_bytes = FIRST_STEP_BYTES
+            block = []
+            tail = b''
+            offsets = array('Q')
+            streams = []
+            # Начало последнего потока до текущей позиции и до начала участка
+            stream_start = chunk_stream = (0, 0)
+            keep = not copyable and self.recompressed_bytes < RECOMPRESSED_BYTES
+            if copyable:
+                self.add_checkpoint(0, 0, 0, None, None)
+
+            while True:
+                data = file.read(READ_SIZE)
+                if not data:
+                    break
+                pieces, decompressor = decompress(decompressor, self.new_decompressor, data, streams)
+                for offset, produced in streams:
+                    stream_start = (compressed_pos + offset, position + produced)
+                streams.clear()
+                compressed_pos += len(data)
+                for piece in pieces:
+                    buffer = tail + piece if tail else piece
+                    newline = buffer.rfind(b'\n')
+                    if newline >= 0:
+                        offsets.extend(index_lines(buffer, 0, newline + 1, base=position - len(tail)))
+                        tail = buffer[newline + 1:]
+                    else:
+                        tail = buffer
+                    position += len(piece)
+                    if keep:
+                        block.append(piece)
+
+                if progress is not None:
+                    progress(compressed_pos, self.compressed_size)
+                if position - interval_start >= interval_bytes:
+                    with self.lock:
+                        if copyable:
+                            self.add_checkpoint(position, compressed_pos, position, decompressor.copy(), None)
+                        else:
+                            self.add_uncopyable_checkpoint(interval_start, chunk_stream, block if keep else None)
+                    block = []
+                    interval_start = position
+                    chunk_stream = stream_start
+                    keep = not copyable and self.recompressed_bytes < RECOMPRESSED_BYTES
+                    interval_bytes = CHECKPOINT_BYTES
+                    yield self.publish(offsets, position - len(tail))
+
+            with self.lock:
+                if not copyable and (position > interval_start or not self.checkpoints):
+                    self.add_uncopyable_checkpoint(interval_start, chunk_stream, block if keep else None)
+            if tail.strip():
+                offsets.append(position - len(tail))
+            yield self.publish(offsets, position)
+
+    def add_uncopyable_checkpoint(self, start, stream, block):
+        """Точка входа xz или zstd: пересжатый участок, пока есть место, иначе начало потока stream."""
+        if block is not None:
+            self.add_checkpoint(start, None, None, None, zlib.compress(b''.join(block), 1))
+        else:
+            self.add_checkpoint(start, stream[0], stream[1], None, None)
+
+    def chunk(self, pos):
+        """Распакованный участок pos между соседними точками входа."""
+        chunk = self.chunks.get(pos)
+        if chunk is not None:
+            self.chunks.move_to_end(pos)
+            return chunk
+
+        compressed_pos, position, state, block = self.checkpoints[pos]
+        if block is not None:
+            chunk = zlib.decompress(block)
+        else:
+            start = self.checkpoint_starts[pos]
+            end = self.checkpoint_starts[pos + 1] if pos + 1 < len(self.checkpoints) else self.size
+            chunk = self.decode(compressed_pos, position, state.copy() if state is not None else None, start, end)
+
+        self.chunks[pos] = chunk
+        if len(self.chunks) > self.cached_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def decode(self, compressed_pos, position, decompressor, start, end):
+        """Байты [start, end), распакованные из файла с compressed_pos, где распаковано position байт.
+
+        Если прошлая распаковка остановилась между position и start, она
+        продолжается (cursor хранит ее состояние и уже распакованный остаток).
+        """
+        cursor = self.cursor
+        if cursor is not None and position <= cursor[1] <= start:
+            compressed_pos, position, decompressor, buffered = cursor
+        else:
+            buffered = b''
+            if decompressor is None:
+                decompressor = self.new_decompressor()
+        parts = [buffered]
+        last = position + len(buffered)
+        self.file.seek(compressed_pos)
+        while last < end:
+            data = self.file.read(READ_SIZE)
+            if not data:
+                break
+            compressed_pos += len(data)
+            pieces, decompressor = decompress(decompressor, self.new_decompressor, data)
+            for piece in pieces:
+                if last + len(piece) <= start:
+                    # Все распакованное до начала участка не нужно
+                    parts = []
+                    position = last + len(piece)
+                else:
+                    parts.append(piece)
+                last += len(piece)
+        data = b''.join(parts)
+        self.cursor = (compressed_pos, end, decompressor, data[end - position:])
+        return data[start - position:end - position]
+
+    def read(self, start, end):
+        """Байты [start, end) распакованного лога."""
+        parts = []
+        with self.lock:
+            pos = bisect_right(self.checkpoint_starts, start) - 1
+            while start < end and pos < len(self.checkpoints):
+                chunk_start = self.checkpoint_starts[pos]
+                chunk = self.chunk(pos)
+                parts.append(chunk[start - chunk_start:end - chunk_start])
+                start = chunk_start + len(chunk)
+                pos += 1
+        return b''.join(parts)
+
+    def refresh(self):
+        """Сжатый файл не дописывается: None, если его заменили, иначе 0."""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != os.fstat(self.file.fileno()).st_ino or stat.st_size != self.compressed_size:
+            return None
+        return 0
+
+    def __len__(self):
+        return len(self.line_offsets)
+
+    def line(self, idx):
+        start = self.line_offsets[idx]
+        end = self.line_offsets[idx + 1] if idx + 1 < len(self.line_offsets) else self.size
+        return self.read(start, end).partition(b'\n')[0].rstrip(b'\r')
+
+    def close(self):
+        self.chunks.clear()
+        self.cursor = None
+        self.file.close()
@@ -0,0 +1,128 @@
+import os
+from array import array
+from bisect import bisect_right
+from heapq import merge
+from itertools import accumulate, repeat
+from operator import add, itemgetter
+
+from records import LogStore
+
+
+class MergedLogSource:
+    """Несколько лог-файлов, показанных как один, упорядоченный по времени.
+
+    Строка объединенного вида хранится одним числом - номером в склейке
+    файлов подряд (order), по нему же определяется файл-источник, так что
+    отдельной копии записей или колонки с файлом нет. Объединенный вид -
+    снимок: дописанные в файлы строки не подхватываются.
+    """
+
+    compressed = False
+
+    def __init__(self, sources, order):
+        self.sources = sources
+        self.order = order
+        self.bases = array('q', accumulate(map(len, sources), initial=0))[:-1]
+        self.file_paths = [source.file_path for source in sources]
+        self.file_path = self.file_paths[0]
+        self.names = [os.path.basename(path) for path in self.file_paths]
+        self.size = sum(source.size for source in sources)
+
+    def __len__(self):
+        return len(self.order)
+
+    def locate(self, idx):
+        position = self.order[idx]
+        number = bisect_right(self.bases, position) - 1
+        return number, position - self.bases[number]
+
+    def line(self, idx):
+        number, row = self.locate(idx)
+        return self.sources[number].line(row)
+
+    def source_name(self, idx):
+        return self.names[self.locate(idx)[0]]
+
+    def refresh(self):
+        return 0
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+
+
+def merge_order(stores, bases):
+    """Порядок строк по времени: номера в склейке файлов подряд.
+
+    Ключ строки - наибольшее время от начала файла до нее, поэтому строки
+    без времени остаются за предыдущей записью, а каждый файл дает
+    неубывающую последовательность для потокового слияния heapq.merge.
+    Если файлы не пересекаются по времени (ротация), они просто ставятся
+    друг за другом.
+    """
+    keys = [array('q', accumulate(store.timestamps, max)) for store in stores]
+    spans = sorted(
+        (key[0], key[-1], base, len(key))
+        for key, base in zip(keys, bases) if len(key)
+    )
+    if all(previous[1] <= current[0] for previous, current in zip(spans, spans[1:])):
+        order = array('i')
+        for first, last, base, count in spans:
+            order.extend(range(base, base + count))
+        return order
+    runs = [zip(key, range(base, base + len(key))) for key, base in zip(keys, bases)]
+    return array('i', map(itemgetter(1), merge(*runs)))
+
+
+def merge_stores(stores):
+    """Сливает полностью разобранные хранилища нескольких файлов в одно, упорядоченное по времени.
+
+    Колонки и полнотекстовые индексы переставляются целиком, после чего
+    исходные хранилища закрываются; их файлы переходят к объединенному.
+    """
+    sources = [store.source for store in stores]
+    bases = list(accumulate(map(len, stores), initial=0))[:-1]
+    order = merge_order(stores, bases)
+    total = len(order)
+    merged = LogStore(MergedLogSource(sources, order))
+
+    levels = bytearray()
+    timestamps = array('q')
+    utc_offsets = array('h')
+    for store in stores:
+        table = bytearray(range(256))
+        for code, name in enumerate(store.level_names):
+            table[code] = merged.level_code(name)
+        levels += store.levels.tobytes().translate(table)
+        timestamps.extend(store.timestamps)
+        utc_offsets.extend(store.utc_offsets)
+    merged.levels = array('B', map(levels.__getitem__, order))
+    merged.timestamps = array('q', map(timestamps.__getitem__, order))
+    merged.utc_offsets = array('h', map(utc_offsets.__getitem__, order))
+    del levels, timestamps, utc_offsets
+
+    inverse = array('i', sorted(range(total), key=order.__getitem__))
+    postings = merged.text_index.postings
+    unsorted = set()
+    for store, base in zip(stores, bases):
+        text_index = store.text_index
+        for token in text_index.tokens():
+            rows = text_index.rows(token)
+            rows = array('i', map(inverse.__getitem__, map(add, rows, repeat(base))))
+            current = postings.get(token)
+            if current is None:
+                postings[token] = rows[0] if len(rows) == 1 else rows
+                continue
+            if type(current) is int:
+                current = postings[token] = array('i', (current,))
+            current.extend(rows)
+            unsorted.add(token)
+        merged.patterns.add_summary(store.patterns.summary())
+        store.source = None
+        store.close()
+    for token in unsorted:
+        postings[token] = array('i', sorted(postings[token]))
+
+    merged.parsed_count = total
+    merged.extend_index(total)
+    return merged
@@ -0,0 +1,150 @@
+from array import array
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QColor, QFont, QTextCharFormat
+
+from records import LogStore
+from render import KEY, TEXT, preview
+from utils import format_timestamp
+
+LEVEL_COLORS = {
+    "INFO": ('green', '#E0E0E0'),
+    "WARNING": ('white', '#FFA500'),
+    "ERROR": ('white', 'red'),
+    "CRITICAL": ('white', 'magenta'),
+    "DEBUG": ('#00B2FF', '#E0E0E0')
+}
+
+
+class LogPalette:
+    """Цвета и общие форматы текста по стилю фрагмента (KEY, TEXT или имя уровня).
+
+    Все QTextCharFormat создаются при запуске с одним общим шрифтом; уровни
+    без своих цветов используют формат TEXT, поэтому при выводе форматы
+    не создаются.
+    """
+
+    def __init__(self, point_size=12):
+        self.key = QColor('blue')
+        self.text = QColor('black')
+        self.background = QColor('#E0E0E0')
+        self.levels = {level: (QColor(fg), QColor(bg)) for level, (fg, bg) in LEVEL_COLORS.items()}
+        font = QFont()
+        font.setPointSize(point_size)
+        self.formats = {
+            style: self.create_format(font, *self.colors(style))
+            for style in [KEY, TEXT, *self.levels]
+        }
+
+    def level_colors(self, level):
+        return self.levels.get(level, (self.text, self.background))
+
+    def colors(self, style):
+        if style == KEY:
+            return self.key, self.background
+        if style == TEXT:
+            return self.text, self.background
+        return self.level_colors(style)
+
+    def create_format(self, font, fg_color, bg_color):
+        char_format = QTextCharFormat()
+        char_format.setForeground(fg_color)
+        char_format.setBackground(bg_color)
+        char_format.setFont(font)
+        return char_format
+
+    def char_format(self, style):
+        return self.formats.get(style) or self.formats[TEXT]
+
+
+class LogTableModel(QAbstractTableModel):
+    COLUMNS = ["Timestamp", "Level", "Message", "Extra"]
+    MERGED_COLUMNS = ["Timestamp", "Level", "Source", "Message", "Extra"]
+
+    def __init__(self, palette, parent=None):
+        super().__init__(parent)
+        self.store = LogStore()
+        self.rows = None
+        self.owns_rows = False
+        self.row_count = 0
+        self.columns = self.COLUMNS
+        self.palette = palette
+
+    def set_store(self, store):
+        self.beginResetModel()
+        self.store = store
+        self.rows = None
+        self.row_count = len(store)
+        self.columns = self.MERGED_COLUMNS if hasattr(store.source, 'source_name') else self.COLUMNS
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """Задает видимые записи: список индексов в хранилище или None для всех.
+
+        Массив не копируется (это может быть индекс хранилища), поэтому
+        число видимых строк запоминается отдельно.
+        """
+        self.beginResetModel()
+        self.rows = rows
+        self.owns_rows = False
+        self.row_count = len(self.store) if rows is None else len(rows)
+        self.endResetModel()
+
+    def append_rows(self, rows=None):
+        """Показывает записи, дописанные в хранилище: все новые при rows=None или только rows."""
+        if self.rows is None:
+            rows_added = len(self.store) - self.row_count
+        else:
+            rows_added = len(rows)
+        if rows_added <= 0:
+            return
+
+        self.beginInsertRows(QModelIndex(), self.row_count, self.row_count + rows_added - 1)
+        if self.rows is not None:
+            if not self.owns_rows:
+                self.rows = array('i', self.rows[:self.row_count])
+                self.owns_rows = True
+            self.rows.extend(rows)
+        self.row_count += rows_added
+        self.endInsertRows()
+
+    def log_index(self, row):
+        return row if self.rows is None else self.rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        column = self.columns[index.column()]
+
+        if role == Qt.DisplayRole:
+            idx = self.log_index(index.row())
+            level, timestamp, utc_offset, message, extra = self.store.record(idx)
+            if column == "Timestamp":
+                return format_timestamp(timestamp, utc_offset)
+            if column == "Level":
+                return level
+            if column == "Source":
+                return self.store.source.source_name(idx)
+            if column == "Message":
+                return " ".join(message.splitlines())
+            return preview(extra) if extra else ''
+
+        if column == "Level" and role in (Qt.ForegroundRole, Qt.BackgroundRole):
+            fg_color, bg_color = self.palette.level_colors(self.store.level(self.log_index(index.row())))
+            return fg_color if role == Qt.ForegroundRole else bg_color
+
+        return None
@@ -1,37 +1,256 @@
-from PyQt5.QtCore import QThread, pyqtSignal
-import time
-import json
+import inspect
 
-from PyQt5.QtWidgets import QApplication
-from utils import parse_log
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from cache import load_store, save_store
+from grep import grep_store
+from ingest import ProgressThrottle, parse_parallel, parse_serial, parse_stores, should_parse_parallel
+from jobs import CancelToken, Cancelled
+from logfile import open_log
+from merge import merge_stores
+from records import LogStore
+
+
+def cached_store(file_path):
+    try:
+        return load_store(file_path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def open_store(file_path, progress=None):
+    """Хранилище файла из кэша или новое, еще не разобранное."""
+    store = cached_store(file_path)
+    if store is None:
+        store = LogStore(open_log(file_path, progress))
+    return store
+
+
+def save_parsed(store):
+    try:
+        save_store(store)
+    except OSError:
+        pass
+
+
+# Задачи планировщика: function(token, progress, *args), progress(позиция, всего)
+# проверяет отмену и может прервать задачу исключением Cancelled. Задача-генератор
+# отдает промежуточные результаты через yield, итог - через return.
+
+def stream_file_job(token, progress, file_path):
+    """Открывает файл так, чтобы первые строки были видны сразу.
+
+    Первым промежуточным результатом отдается хранилище с первой порцией
+    строк (дальше им владеет получатель), затем число строк после каждой
+    следующей порции - строки дописываются в хранилище здесь же. Когда
+    индекс строк готов, записи разбираются, так что счетчики уровней
+    растут по ходу загрузки. Из кэша хранилище отдается сразу целиком.
+    """
+    store = cached_store(file_path)
+    if store is None:
+        source = open_log(file_path, scan=False)
+        store = LogStore(source)
+        shown = False
+        for added in source.scan_steps(progress):
+            store.append_rows(added)
+            yield len(store) if shown else store
+            shown = True
+        if not shown:
+            yield store
+    else:
+        yield store
+    index_job(token, progress, store)
+
+
+def merge_files_job(token, progress, file_paths):
+    """Открывает несколько файлов, разбирает их в одном пуле процессов и сливает по времени."""
+    stores = []
+    try:
+        for file_path in file_paths:
+            token.check()
+            stores.append(open_store(file_path))
+        parsed = [store for store in stores if not store.is_indexed()]
+        parse_stores(parsed, progress)
+        for store in parsed:
+            save_parsed(store)
+        token.check()
+        return merge_stores(stores)
+    except BaseException:
+        for store in stores:
+            store.close()
+        raise
+
+
+def index_job(token, progress, store):
+    """Разбирает оставшиеся записи и строит индексы; готовый индекс сохраняется в кэш."""
+    if store.is_indexed():
+        return
+    if should_parse_parallel(store):
+        parse_parallel(store, progress=progress)
+    else:
+        parse_serial(store, progress=progress)
+    save_parsed(store)
+
+
+def filter_job(token, progress, store, search, log_filter):
+    """Номера строк, подходящих под поиск и фильтр; до этого при необходимости строит индексы."""
+    index_job(token, progress, store)
+    token.check()
+    rows = store.search(search, progress) if search else None
+    token.check()
+    if log_filter is not None:
+        rows = log_filter.rows(store, rows, progress)
+    return rows
+
+
+def grep_job(token, progress, store, pattern, log_filter):
+    """Записи, в сырых строках которых есть совпадение pattern, порциями по мере просмотра файла.
+
+    Без фильтра записи не разбираются; с фильтром сначала строятся индексы,
+    и фильтр применяется к каждой порции.
+    """
+    if log_filter is not None:
+        index_job(token, progress, store)
+    for rows in grep_store(store, pattern, progress):
+        if log_filter is not None:
+            # Отмена проверяется, но прогресс остается по байтам файла
+            rows = log_filter.rows(store, rows, lambda position, total: token.check())
+        if len(rows):
+            yield rows
+
+
+def yield_partial(steps, emit):
+    """Передает значения генератора в emit и возвращает его итог."""
+    while True:
+        try:
+            value = next(steps)
+        except StopIteration as stop:
+            return stop.value
+        emit(value)
+
+
+class JobThread(QThread):
+    """Выполняет одну задачу планировщика в фоне; результат или текст ошибки остаются в атрибутах."""
 
-class LogProcessingThread(QThread):
     progress = pyqtSignal(int)
-    finished = pyqtSignal()
-    error = pyqtSignal(str)
+    partial = pyqtSignal(object)
 
-    def __init__(self, file_path, parent=None):
+    def __init__(self, key, function, args, parent=None):
         super().__init__(parent)
-        self.file_path = file_path
-        self.logs = []
+        self.key = key
+        self.function = function
+        self.args = args
+        self.token = CancelToken()
+        self.result = None
+        self.error = None
 
     def run(self):
+        throttle = ProgressThrottle(self.progress.emit)
+
+        def progress(position, total):
+            self.token.check()
+            throttle.update(position, total)
+
         try:
-            start_time = time.time()
+            result = self.function(self.token, progress, *self.args)
+            if inspect.isgenerator(result):
+                result = yield_partial(result, self.partial.emit)
+            self.result = result
+        except Cancelled:
+            pass
+        except Exception as e:
+            self.error = str(e)
 
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
 
-            total_lines = len(lines)
-            for idx, line in enumerate(lines):
-                if line.strip():
-                    log_parts, level = parse_log(line.strip())
-                    self.logs.append((log_parts, level))
-                self.progress.emit(int(((idx + 1) / total_lines * 50) + 0))
-                QApplication.processEvents()
+class JobScheduler(QObject):
+    """Очередь фоновых задач окна: загрузка, разбор, фильтрация.
 
-            self.finished.emit()
-            end_time = time.time()
+    Одновременно выполняется одна задача, поэтому задачи не делят
+    хранилище друг с другом. Новая задача с тем же ключом заменяет ждущую
+    в очереди и отменяет выполняющуюся (новый фильтр отменяет старый),
+    callback и partial (промежуточные результаты задачи-генератора)
+    вызываются только для неотмененной задачи. Прогресс всех задач идет
+    через один сигнал progress.
+    """
 
-        except Exception as e:
-            self.error.emit(str(e))
+    progress = pyqtSignal(int)
+    started = pyqtSignal(str)
+    idle = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.current = None
+        self.callback = None
+        self.partial = None
+        self.pending = {}
+
+    def submit(self, key, function, args=(), callback=None, partial=None):
+        self.pending.pop(key, None)
+        self.pending[key] = (function, args, callback, partial)
+        if self.current is not None and self.current.key == key:
+            self.current.token.cancel()
+        self.start_next()
+
+    def cancel(self, key=None):
+        """Отменяет задачи с ключом key (все задачи, если key не задан): ждущие и выполняющуюся."""
+        if key is None:
+            self.pending.clear()
+        else:
+            self.pending.pop(key, None)
+        if self.current is not None and key in (None, self.current.key):
+            self.current.token.cancel()
+
+    def cancel_pending(self):
+        """Убирает из очереди еще не начатые задачи; выполняющаяся продолжается."""
+        self.pending.clear()
+
+    def shutdown(self):
+        """Отменяет задачи и дожидается остановки выполняющейся, например при закрытии окна."""
+        self.cancel()
+        if self.current is not None:
+            self.current.wait()
+
+    def is_busy(self):
+        return self.current is not None or bool(self.pending)
+
+    def running_key(self):
+        return self.current.key if self.current is not None else None
+
+    def start_next(self):
+        if self.current is not None:
+            return
+        if not self.pending:
+            self.idle.emit()
+            return
+        key = next(iter(self.pending))
+        function, args, self.callback, self.partial = self.pending.pop(key)
+        self.current = JobThread(key, function, args, self)
+        self.current.progress.connect(self.progress)
+        self.current.partial.connect(self.deliver_partial)
+        self.current.finished.connect(self.finish_job)
+        self.current.start()
+        self.started.emit(key)
+
+    def deliver_partial(self, value):
+        # Промежуточные результаты приходят раньше сигнала о завершении задачи
+        if self.current.token.is_cancelled():
+            # Хранилище, которое так и не дошло до получателя, закрывается здесь
+            if isinstance(value, LogStore):
+                value.close()
+        elif self.partial is not None:
+            self.partial(value)
+
+    def finish_job(self):
+        thread, callback = self.current, self.callback
+        self.current = self.callback = self.partial = None
+        thread.deleteLater()
+        if thread.error is not None:
+            self.error.emit(thread.error)
+        elif thread.token.is_cancelled():
+            # Отмена могла прийти, когда задача уже открыла хранилище
+            if isinstance(thread.result, LogStore):
+                thread.result.close()
+        elif callback is not None:
+            callback(thread.result)
+        self.start_next()
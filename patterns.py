@@ -0,0 +1,155 @@
+import re
+from collections import Counter
+from operator import eq
+
+from search import tokenize
+from utils import NO_TIMESTAMP
+
+WILDCARD = '<*>'
+SIMILARITY = 0.4
+PREFIX_DEPTH = 1
+MAX_CHILDREN = 100
+MAX_PATTERNS = 5000
+KNOWN_MESSAGES = 10000
+# Переменная часть - от первой цифры до конца слова: числа, время, адреса, UUID, ID
+MASK_RE = re.compile(r'\d[\w.:,-]*')
+
+
+class Pattern:
+    """Шаблон сообщений и сводка по его записям: число, первое и последнее время, число по уровням."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.levels = Counter()
+
+    def template(self):
+        return ' '.join(self.tokens)
+
+    def add(self, level, timestamp, utc_offset):
+        self.count += 1
+        self.levels[level] += 1
+        if timestamp != NO_TIMESTAMP:
+            if self.first is None or timestamp < self.first[0]:
+                self.first = (timestamp, utc_offset)
+            if self.last is None or timestamp >= self.last[0]:
+                self.last = (timestamp, utc_offset)
+
+    def merge(self, count, first, last, levels):
+        self.count += count
+        self.levels.update(levels)
+        if first is not None and (self.first is None or first[0] < self.first[0]):
+            self.first = tuple(first)
+        if last is not None and (self.last is None or last[0] >= self.last[0]):
+            self.last = tuple(last)
+
+
+class TemplateMiner:
+    """Инкрементальная кластеризация сообщений по шаблонам (алгоритм Drain).
+
+    Сообщения одной длины раскладываются по дереву первых PREFIX_DEPTH
+    токенов; в листе выбирается самый похожий шаблон (доля совпавших
+    токенов не меньше SIMILARITY), несовпавшие токены шаблона заменяются
+    на <*>. Хранятся только шаблоны и их сводки, а не записи, а число
+    шаблонов ограничено max_patterns: после него сообщение сливается
+    с ближайшим шаблоном листа. Номера шаблонов для последних
+    KNOWN_MESSAGES сообщений после маскирования запоминаются, так что
+    повторяющиеся сообщения не проходят по дереву. Сводку (summary) можно
+    слить в другой экземпляр, так разбор в нескольких процессах дает общий результат.
+    """
+
+    def __init__(self, max_patterns=MAX_PATTERNS):
+        self.patterns = []
+        self.leaves = {}
+        self.children = Counter()
+        self.known = {}
+        self.max_patterns = max_patterns
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def leaf_key(self, tokens, create):
+        """Путь в дереве: длина и первые токены; токены с <*> и лишние ветви идут в ветвь <*>."""
+        key = (len(tokens),)
+        for token in tokens[:PREFIX_DEPTH]:
+            child = key + (WILDCARD if WILDCARD in token else token,)
+            if child not in self.children:
+                if not create or self.children[key] >= MAX_CHILDREN:
+                    child = key + (WILDCARD,)
+                if create and child not in self.children:
+                    self.children[key] += 1
+                    self.children[child] = 0
+            key = child
+        return key
+
+    def find(self, tokens, leaf):
+        """Самый похожий шаблон листа: (номер, доля совпавших токенов) или (None, 0)."""
+        best, best_similarity = None, -1.0
+        for number in leaf:
+            similarity = sum(map(eq, self.patterns[number].tokens, tokens)) / len(tokens) if tokens else 1.0
+            if similarity > best_similarity:
+                best, best_similarity = number, similarity
+        return best, best_similarity
+
+    def classify(self, tokens):
+        """Номер шаблона для токенов; шаблон обобщается или создается при необходимости."""
+        leaf = self.leaves.setdefault(self.leaf_key(tokens, True), [])
+        number, similarity = self.find(tokens, leaf)
+        if number is None or (similarity < SIMILARITY and len(self.patterns) < self.max_patterns):
+            number = len(self.patterns)
+            self.patterns.append(Pattern(tokens))
+            leaf.append(number)
+            return number
+        pattern = self.patterns[number]
+        if similarity < 1.0:
+            pattern.tokens = [token if token == other else WILDCARD for token, other in zip(pattern.tokens, tokens)]
+        return number
+
+    def add(self, message, level, timestamp, utc_offset):
+        masked = MASK_RE.sub(WILDCARD, message)
+        number = self.known.get(masked)
+        if number is None:
+            if len(self.known) >= KNOWN_MESSAGES:
+                self.known.clear()
+            number = self.known[masked] = self.classify(masked.split())
+        self.patterns[number].add(level, timestamp, utc_offset)
+
+    def match(self, message):
+        """Номер подходящего шаблона без изменения шаблонов или None."""
+        masked = MASK_RE.sub(WILDCARD, message)
+        number = self.known.get(masked)
+        if number is not None:
+            return number
+        tokens = masked.split()
+        number, similarity = self.find(tokens, self.leaves.get(self.leaf_key(tokens, False), ()))
+        return number if similarity >= SIMILARITY else None
+
+    def summary(self):
+        """Шаблоны со сводками: [шаблон, число, первое время, последнее время, {уровень: число}]."""
+        return [
+            [pattern.template(), pattern.count, pattern.first, pattern.last, dict(pattern.levels)]
+            for pattern in self.patterns
+        ]
+
+    def add_summary(self, summary):
+        for template, count, first, last, levels in summary:
+            self.patterns[self.classify(template.split())].merge(count, first, last, levels)
+
+
+def pattern_members(store, number, limit):
+    """Первые limit записей шаблона number: ищутся по постоянным словам шаблона в индексе текста.
+
+    Слова с <*> (kkt<*>) пропускаются: их начало (kkt) - не отдельный токен текста.
+    """
+    pattern = store.patterns.patterns[number]
+    words = tokenize(' '.join(token for token in pattern.tokens if WILDCARD not in token))
+    rows = store.search(' '.join(words)) if words else range(store.indexed_count)
+    members = []
+    for idx in rows:
+        if store.patterns.match(store.message(idx)) == number:
+            members.append(idx)
+            if len(members) >= limit:
+                break
+    return members
@@ -0,0 +1,231 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import compress, islice, repeat
+from operator import le, ne
+
+from patterns import TemplateMiner
+from search import TextIndex, record_text
+from utils import NO_TIMESTAMP, parse_log
+
+LEVELS = ["INFO", "WARNING", "ERROR", "CRITICAL", "DEBUG"]
+LEVEL_SEVERITY = {
+    "TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25,
+    "WARNING": 30, "ERROR": 40, "CRITICAL": 50
+}
+UNPARSED = 255
+
+
+class TimeIndex:
+    """Отсортированные по времени метки и соответствующие им строки.
+
+    Строки без времени в индекс не попадают. Если лог уже упорядочен по
+    времени (обычный случай), сортировка не выполняется.
+    """
+
+    def __init__(self, timestamps):
+        rows = array('i', compress(range(len(timestamps)), map(ne, timestamps, repeat(NO_TIMESTAMP))))
+        times = array('q', map(timestamps.__getitem__, rows))
+        self.ordered = all(map(le, times, islice(times, 1, None)))
+        if not self.ordered:
+            order = sorted(range(len(times)), key=times.__getitem__)
+            rows = array('i', map(rows.__getitem__, order))
+            times = array('q', map(times.__getitem__, order))
+        self.rows = rows
+        self.times = times
+        self.size = len(timestamps)
+
+    def extend(self, timestamps):
+        """Дописывает строки, добавленные в конец лога; False, если порядок нарушен и нужна перестройка."""
+        index = TimeIndex(timestamps[self.size:])
+        if not index.ordered or (len(index) and len(self) and index.times[0] < self.times[-1]):
+            return False
+        self.rows.extend(row + self.size for row in index.rows)
+        self.times.extend(index.times)
+        self.size = len(timestamps)
+        return True
+
+    def __len__(self):
+        return len(self.times)
+
+    def rows_between(self, low, high):
+        """Строки со временем в [low, high], по возрастанию номера строки."""
+        start = bisect_left(self.times, low)
+        stop = bisect_right(self.times, high)
+        rows = self.rows[start:stop]
+        return rows if self.ordered else array('i', sorted(rows))
+
+
+class LogStore:
+    """Колоночное хранилище записей лога поверх индексированного файла.
+
+    На каждую запись хранятся только код уровня, время (эпоха в микросекундах)
+    и смещение часового пояса. Строка разбирается при первом показе или
+    фильтрации; сообщение и extra берутся из отображенного в память файла
+    и держатся в ограниченном LRU-кэше.
+    """
+
+    def __init__(self, source=None, cache_size=4096):
+        self.source = source
+        total = len(source) if source is not None else 0
+        self.level_names = list(LEVELS)
+        self.level_codes = {name: code for code, name in enumerate(self.level_names)}
+        self.levels = array('B', [UNPARSED]) * total
+        self.timestamps = array('q', [NO_TIMESTAMP]) * total
+        self.utc_offsets = array('h', [0]) * total
+        self.parsed_count = 0
+        self.level_rows = {}
+        self.indexed_count = 0
+        self.text_index = TextIndex()
+        self.patterns = TemplateMiner()
+        self.time_index_cache = None
+        self.time_index_parsed = 0
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.levels)
+
+    def level_code(self, name):
+        code = self.level_codes.get(name)
+        if code is None:
+            if len(self.level_names) >= UNPARSED:
+                raise ValueError(f"Too many distinct log levels, cannot intern {name!r}")
+            code = len(self.level_names)
+            self.level_names.append(name)
+            self.level_codes[name] = code
+        return code
+
+    def append_rows(self, count):
+        """Добавляет count еще не разобранных строк, дописанных в конец источника."""
+        with self.lock:
+            self.levels.extend(array('B', [UNPARSED]) * count)
+            self.timestamps.extend(array('q', [NO_TIMESTAMP]) * count)
+            self.utc_offsets.extend(array('h', [0]) * count)
+
+    def set_columns(self, idx, level, timestamp, utc_offset):
+        with self.lock:
+            if self.levels[idx] == UNPARSED:
+                self.parsed_count += 1
+            self.levels[idx] = self.level_code(level)
+            self.timestamps[idx] = timestamp
+            self.utc_offsets[idx] = utc_offset
+
+    def record(self, idx):
+        """Возвращает разобранную запись (уровень, время, смещение пояса, сообщение, extra).
+
+        Записи читают и окно, и фоновые задачи, поэтому кэш меняется под блокировкой.
+        """
+        with self.lock:
+            record = self.cache.get(idx)
+            if record is not None:
+                self.cache.move_to_end(idx)
+                return record
+
+        record = parse_log(self.source.line(idx))
+        if self.levels[idx] == UNPARSED:
+            self.set_columns(idx, *record[:3])
+        with self.lock:
+            self.cache[idx] = record
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return record
+
+    def parse_range(self, start, stop):
+        """Заполняет колонки, полнотекстовый индекс и шаблоны сообщений для строк [start, stop) без заполнения кэша.
+
+        Вызывается по возрастанию строк, чтобы списки строк в индексе оставались упорядоченными.
+        """
+        line = self.source.line
+        add_text = self.text_index.add
+        add_pattern = self.patterns.add
+        for idx in range(start, stop):
+            level, timestamp, utc_offset, message, extra = parse_log(line(idx))
+            self.set_columns(idx, level, timestamp, utc_offset)
+            add_text(idx, record_text(message, extra))
+            with self.lock:
+                add_pattern(message, level, timestamp, utc_offset)
+
+    def set_batch(self, first, level_names, levels, timestamps, utc_offsets, postings, patterns):
+        """Записывает колонки, токены и сводку шаблонов, разобранные в другом процессе, начиная со строки first."""
+        table = bytearray(range(256))
+        for code, name in enumerate(level_names):
+            table[code] = self.level_code(name)
+        last = first + len(levels)
+        with self.lock:
+            self.parsed_count += self.levels[first:last].count(UNPARSED)
+            self.levels[first:last] = array('B', levels.translate(table))
+            self.timestamps[first:last] = timestamps
+            self.utc_offsets[first:last] = utc_offsets
+            self.patterns.add_summary(patterns)
+        self.text_index.merge(postings)
+
+    def is_parsed(self):
+        return self.parsed_count == len(self)
+
+    def extend_index(self, stop):
+        """Дописывает в индекс уровней (array('i') позиций на уровень) уже разобранные строки до stop."""
+        start = self.indexed_count
+        levels = self.levels[start:stop]
+        for code in set(levels):
+            rows = self.level_rows.get(code)
+            if rows is None:
+                rows = self.level_rows[code] = array('i')
+            rows.extend(compress(range(start, stop), map(code.__eq__, levels)))
+        self.indexed_count = max(start, stop)
+
+    def is_indexed(self):
+        return self.indexed_count == len(self)
+
+    def time_index(self):
+        """Индекс времени по разобранным строкам.
+
+        Перестраивается, если с прошлого раза разобраны еще строки; строки,
+        дописанные в конец полностью разобранного лога, только добавляются.
+        """
+        with self.lock:
+            parsed = self.parsed_count
+        index = self.time_index_cache
+        if index is None or index.size != len(self) or self.time_index_parsed != parsed:
+            appended = index is not None and self.time_index_parsed == index.size and parsed == len(self)
+            if not (appended and index.ordered and index.extend(self.timestamps)):
+                index = self.time_index_cache = TimeIndex(self.timestamps)
+            self.time_index_parsed = parsed
+        return index
+
+    def rows_for_level(self, name):
+        code = self.level_codes.get(name)
+        return self.level_rows.get(code, array('i'))
+
+    def search(self, query, progress=None):
+        return self.text_index.search(query, self.row_text, progress)
+
+    def row_text(self, idx):
+        level, timestamp, utc_offset, message, extra = self.record(idx)
+        return record_text(message, extra)
+
+    def level(self, idx):
+        code = self.levels[idx]
+        if code == UNPARSED:
+            return self.record(idx)[0]
+        return self.level_names[code]
+
+    def message(self, idx):
+        return self.record(idx)[3]
+
+    def extra(self, idx):
+        return self.record(idx)[4]
+
+    def level_counts(self):
+        if self.is_indexed():
+            return {name: len(self.level_rows.get(code, ())) for code, name in enumerate(self.level_names)}
+        levels = self.levels.tobytes()
+        return {name: levels.count(code) for code, name in enumerate(self.level_names)}
+
+    def close(self):
+        self.cache.clear()
+        self.text_index.close()
+        if self.source is not None:
+            self.source.close()
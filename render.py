@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+
+from decoders import dumps_compact
+from utils import format_timestamp
+
+KEY = 'key'
+TEXT = 'text'
+SEPARATOR = "\n" + "-" * 80 + "\n"
+FRAME_BUDGET = 0.016
+MAX_BATCH = 500
+PREVIEW_CHARS = 200
+DETAIL_CACHE_SIZE = 1000
+
+
+def preview(value, limit=PREVIEW_CHARS):
+    """Компактная однострочная JSON-строка значения, обрезанная до limit символов."""
+    text = dumps_compact(value)
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def record_parts(store, idx):
+    """Собирает фрагменты (текст, стиль) для подробного вывода записи.
+
+    Стиль - KEY для подписей, TEXT для значений или имя уровня для самого
+    уровня; цвета и форматы по стилю назначает слой отображения. Значения
+    extra выводятся одной обрезанной строкой, целиком их показывает дерево JSON.
+    """
+    level, timestamp, utc_offset, message, extra = store.record(idx)
+
+    parts = [
+        ("Timestamp: ", KEY),
+        (f"{format_timestamp(timestamp, utc_offset)}\n", TEXT),
+    ]
+    if hasattr(store.source, 'source_name'):
+        parts.extend([
+            ("Source: ", KEY),
+            (f"{store.source.source_name(idx)}\n", TEXT)
+        ])
+    parts.extend([
+        ("Level: ", KEY),
+        (f"{level}\n", level),
+        ("Message: ", KEY),
+        (f"{message}\n", TEXT)
+    ])
+
+    if isinstance(extra, dict):
+        for key, value in extra.items():
+            parts.extend([
+                (f"  {key}: ", KEY),
+                (preview(value) + "\n", TEXT)
+            ])
+
+    return parts
+
+
+class DetailCache:
+    """Фрагменты подробного вывода последних показанных записей хранилища (LRU).
+
+    Повторное выделение тех же записей не разбирает и не форматирует их
+    заново; при смене хранилища кэш очищается.
+    """
+
+    def __init__(self, size=DETAIL_CACHE_SIZE):
+        self.size = size
+        self.parts = OrderedDict()
+
+    def record_parts(self, store, idx):
+        parts = self.parts.get(idx)
+        if parts is not None:
+            self.parts.move_to_end(idx)
+            return parts
+        parts = self.parts[idx] = record_parts(store, idx)
+        if len(self.parts) > self.size:
+            self.parts.popitem(last=False)
+        return parts
+
+    def clear(self):
+        self.parts.clear()
+
+
+def records_parts(store, indexes, cache=None):
+    """Фрагменты нескольких записей подряд, каждая завершается разделителем."""
+    parts = []
+    for idx in indexes:
+        parts.extend(record_parts(store, idx) if cache is None else cache.record_parts(store, idx))
+        parts.append((SEPARATOR, TEXT))
+    return parts
+
+
+def next_batch_size(size, elapsed, budget=FRAME_BUDGET):
+    """Размер следующей пачки записей, чтобы ее вывод укладывался в budget секунд.
+
+    Размер пересчитывается по времени прошлой пачки, но растет не больше
+    чем вдвое за раз, чтобы один быстрый замер не дал пачку на несколько кадров.
+    """
+    if elapsed <= 0:
+        return min(size * 2, MAX_BATCH)
+    return max(1, min(int(size * budget / elapsed), size * 2, MAX_BATCH))
+
+
+def merge_parts(parts):
+    """Склеивает соседние фрагменты одного стиля, чтобы вставлять их одним вызовом."""
+    return [(''.join(map(itemgetter(0), group)), style) for style, group in groupby(parts, key=itemgetter(1))]
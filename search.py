@@ -0,0 +1,257 @@
+import json
+import math
+import re
+from array import array
+from heapq import merge
+from itertools import groupby
+
+from jobs import checkpoints
+
+TOKEN_RE = re.compile(r'\w+')
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def extra_values(value, parts):
+    """Дописывает в parts строки и скаляры из value без ключей.
+
+    Строки берутся как есть, а не из JSON, где перевод строки, кавычка
+    или табуляция экранированы и склеиваются с соседним словом (\\nFiscal).
+    Скаляры пишутся как в JSON (true, null, Infinity), с которым фильтр
+    сравнивает строковый литерал.
+    """
+    if isinstance(value, str):
+        parts.append(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            extra_values(item, parts)
+    elif isinstance(value, list):
+        for item in value:
+            extra_values(item, parts)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        parts.append(str(value))
+    elif isinstance(value, float) and math.isfinite(value):
+        parts.append(repr(value))
+    else:
+        parts.append(json.dumps(value))
+
+
+def record_text(message, extra):
+    """Текст записи для поиска: сообщение и значения extra без ключей."""
+    if extra:
+        parts = [message]
+        extra_values(extra, parts)
+        return ' '.join(parts)
+    return message
+
+
+def parse_query(query):
+    """Разбирает запрос в список OR-групп, каждая группа - список фраз (кортежей токенов).
+
+    Слова внутри группы объединяются через AND, группы разделяются словом OR.
+    Фраза в кавычках или слово, распадающееся на несколько токенов
+    (например, UUID чека), ищется как последовательность токенов.
+    """
+    groups = [[]]
+    for quoted, word in QUERY_RE.findall(query):
+        if word == 'OR':
+            groups.append([])
+            continue
+        tokens = tuple(tokenize(quoted if word == '' else word))
+        if tokens:
+            groups[-1].append(tokens)
+    return [group for group in groups if group]
+
+
+def contains_phrase(tokens, phrase):
+    phrase = list(phrase)
+    size = len(phrase)
+    return any(
+        tokens[pos:pos + size] == phrase
+        for pos, token in enumerate(tokens) if token == phrase[0]
+    )
+
+
+def matches_query(query, text):
+    """Проверяет запрос на тексте одной записи, без индекса."""
+    tokens = tokenize(text)
+    token_set = set(tokens)
+    return any(
+        all(contains_phrase(tokens, phrase) if len(phrase) > 1 else phrase[0] in token_set for phrase in group)
+        for group in parse_query(query)
+    )
+
+
+class MappedTextIndex:
+    """Неизменяемый инвертированный индекс поверх отображенного в память кэша.
+
+    Токены отсортированы по байтам UTF-8 и ищутся бинарным поиском, списки
+    строк возвращаются как memoryview без копирования.
+    """
+
+    def __init__(self, blob, token_offsets, postings_offsets, postings):
+        self.blob = blob
+        self.token_offsets = token_offsets
+        self.postings_offsets = postings_offsets
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.token_offsets) - 1
+
+    def token_bytes(self, pos):
+        return bytes(self.blob[self.token_offsets[pos]:self.token_offsets[pos + 1]])
+
+    def tokens(self):
+        for pos in range(len(self)):
+            yield self.token_bytes(pos).decode('utf-8')
+
+    def rows(self, token):
+        key = token.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.token_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self) or self.token_bytes(low) != key:
+            return ()
+        return self.postings[self.postings_offsets[low]:self.postings_offsets[low + 1]]
+
+    def close(self):
+        for view in (self.blob, self.token_offsets, self.postings_offsets, self.postings):
+            view.release()
+
+
+def split_tokens(text):
+    return text.split('\n') if text else []
+
+
+def pack_postings(postings):
+    """Упаковывает словарь токен -> список строк для передачи из процесса разбора в TextIndex.merge.
+
+    Вместо сотен тысяч списков передаются две строки токенов через перевод
+    строки (в токенах его не бывает) и три массива: токены из одной строки
+    (обычно идентификаторы) с номерами строк и остальные токены с числом
+    строк и самими строками подряд.
+    """
+    singles = []
+    single_rows = array('i')
+    tokens = []
+    counts = array('i')
+    rows = array('i')
+    for token, token_rows in postings.items():
+        if len(token_rows) == 1:
+            singles.append(token)
+            single_rows.append(token_rows[0])
+        else:
+            tokens.append(token)
+            counts.append(len(token_rows))
+            rows.extend(token_rows)
+    return '\n'.join(singles), single_rows, '\n'.join(tokens), counts, rows
+
+
+class TextIndex:
+    """Инвертированный индекс токен -> возрастающие номера строк.
+
+    Строки добавляются по возрастанию номера во время загрузки. Токен,
+    встреченный один раз, хранится числом, а не массивом, чтобы уникальные
+    идентификаторы не раздували память. base - индекс, загруженный из кэша;
+    новые строки дописываются поверх него в память.
+    """
+
+    def __init__(self, base=None):
+        self.postings = {}
+        self.base = base
+
+    def add(self, row, text):
+        postings = self.postings
+        for token in set(tokenize(text)):
+            rows = postings.get(token)
+            if rows is None:
+                postings[token] = row
+            elif type(rows) is int:
+                postings[token] = array('i', (rows, row))
+            else:
+                rows.append(row)
+
+    def merge(self, batch):
+        """Дописывает индекс строк, построенный в другом процессе и упакованный pack_postings.
+
+        Уникальные токены пачки добавляются одним dict.update, по одному
+        обрабатываются только уже известные токены и токены из нескольких строк.
+        """
+        single_text, single_rows, text, counts, rows = batch
+        postings = self.postings
+        singles = split_tokens(single_text)
+        known = {token: postings[token] for token in postings.keys() & singles}
+        postings.update(zip(singles, single_rows))
+        for token, current in known.items():
+            if type(current) is int:
+                current = array('i', (current,))
+            current.append(postings[token])
+            postings[token] = current
+
+        end = 0
+        for token, count in zip(split_tokens(text), counts):
+            start, end = end, end + count
+            current = postings.get(token)
+            if current is None:
+                postings[token] = rows[start:end]
+            else:
+                if type(current) is int:
+                    current = postings[token] = array('i', (current,))
+                current.extend(rows[start:end])
+
+    def rows(self, token):
+        rows = self.postings.get(token)
+        base_rows = self.base.rows(token) if self.base is not None else ()
+        if rows is None:
+            return base_rows
+        if type(rows) is int:
+            rows = (rows,)
+        if not len(base_rows):
+            return rows
+        merged = array('i', base_rows)
+        merged.extend(rows)
+        return merged
+
+    def tokens(self):
+        """Все токены индекса по возрастанию."""
+        tokens = sorted(self.postings)
+        if self.base is None:
+            return tokens
+        return [token for token, _ in groupby(merge(self.base.tokens(), tokens))]
+
+    def close(self):
+        if self.base is not None:
+            self.base.close()
+            self.base = None
+
+    def search(self, query, text, progress=None):
+        """Возвращает array('i') строк, подходящих под запрос.
+
+        text(row) возвращает текст записи и нужен только для проверки фраз
+        на строках-кандидатах; progress(позиция, всего) вызывается по ходу
+        проверки и может прервать ее.
+        """
+        matches = set()
+        for group in parse_query(query):
+            tokens = sorted({token for phrase in group for token in phrase}, key=lambda t: len(self.rows(t)))
+            candidates = set(self.rows(tokens[0]))
+            for token in tokens[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(self.rows(token))
+
+            phrases = [phrase for phrase in group if len(phrase) > 1]
+            if phrases:
+                candidates = {
+                    row for row in checkpoints(sorted(candidates), progress)
+                    if all(contains_phrase(tokenize(text(row)), phrase) for phrase in phrases)
+                }
+            matches |= candidates
+        return array('i', sorted(matches))
@@ -0,0 +1,37 @@
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import parse_block
+from logfile import index_lines, iter_lines, open_log
+
+LINES = [b'{"record": {"message": "first"}}', b'{"record": {"message": "second"}}']
+TEXT = b'\n'.join([LINES[0], b'   ', b'\r', b'', b'\t \r', LINES[1], b' \r'])
+
+
+class BlankLinesTest(unittest.TestCase):
+    def test_index_lines(self):
+        self.assertEqual(list(index_lines(TEXT)), [0, TEXT.index(LINES[1])])
+
+    def test_parse_block(self):
+        self.assertEqual(len(parse_block(TEXT, 0)[1]), len(LINES))
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, data in (('plain.log', TEXT), ('packed.log.gz', gzip.compress(TEXT))):
+                path = os.path.join(directory, name)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                with self.subTest(name):
+                    source = open_log(path)
+                    self.assertEqual([source.line(idx) for idx in range(len(source))], LINES)
+                    source.close()
+                    self.assertEqual(list(iter_lines(path)), LINES)
+
+
+if __name__ == '__main__':
+    unittest.main()
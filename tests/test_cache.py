@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import cache_path, load_store, save_store
+from ingest import parse_serial
+from logfile import LogFile
+from records import LogStore
+
+
+def record_line(idx, code='A'):
+    return json.dumps({'text': '', 'record': {'level': {'name': 'INFO'}, 'message': f"Receipt {idx} code {code}"}})
+
+
+class CacheTest(unittest.TestCase):
+    """Кэш используется для того же или дописанного файла и отбрасывается для измененного."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.old_cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.directory.name
+        self.path = os.path.join(self.directory.name, 'app.log')
+        self.write([record_line(idx) for idx in range(2000)], 'w')
+        store = LogStore(LogFile(self.path))
+        parse_serial(store)
+        save_store(store)
+        store.close()
+
+    def tearDown(self):
+        if self.old_cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.old_cache_home
+
+    def write(self, lines, mode):
+        with open(self.path, mode) as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+    def test_same_file(self):
+        store = load_store(self.path)
+        self.assertEqual(len(store), 2000)
+        self.assertEqual(list(store.search('receipt 1000')), [1000])
+        store.close()
+
+    def test_appended(self):
+        self.write([record_line(2000)], 'a')
+        store = load_store(self.path)
+        self.assertEqual(len(store), 2001)
+        self.assertEqual(list(store.search('2000')), [2000])
+        store.close()
+
+    def test_truncated(self):
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) // 2)
+        self.assertIsNone(load_store(self.path))
+
+    def test_invalid_cache_file_removed(self):
+        path = cache_path(self.path)
+        with open(path, 'r+b') as f:
+            f.write(b'XXXXXXXX')
+        self.assertIsNone(load_store(self.path))
+        self.assertFalse(os.path.exists(path))
+
+    def test_same_size_edit_in_middle(self):
+        stat = os.stat(self.path)
+        self.write([record_line(idx, 'B' if idx == 1000 else 'A') for idx in range(2000)], 'w')
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(os.path.getsize(self.path), stat.st_size)
+        self.assertIsNone(load_store(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
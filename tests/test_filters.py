@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filters import compile_filter
+from ingest import parse_serial
+from logfile import LogFile
+from records import LogStore
+
+QUERIES = [
+    'extra.x == null',
+    'extra.x != null',
+    'extra.flag == true',
+    'extra.shift_id == 42',
+    'extra.shift_id == 42.0',
+    'extra.shift_id = 1e1',
+    'extra.shift_id == "42"',
+    'extra.code == "A-7"',
+    'message == "Receipt 12 processed"',
+    'level == ERROR and extra.shift_id == 10',
+    'extra.note == "line 5\nline 6"',
+    'extra.note == "tab 1\tcell"',
+    'extra.note == "cr 7\rend"',
+    'extra.note == "say \\"quoted 3\\""',
+    'extra.note == "path C:\\\\kkt\\\\9"',
+    'extra.receipt == \'{"id": 4}\'',
+]
+NOTES = ['line {}\nline {}', 'tab {}\tcell', 'cr {}\rend', 'say "quoted {}"', 'path C:\\kkt\\{}']
+
+
+def sample_line(idx):
+    extra = {
+        'shift_id': [idx % 50, float(idx % 50), str(idx % 50)][idx % 3],
+        'x': None if idx % 2 else idx,
+        'flag': idx % 4 == 0,
+        'code': f"A-{idx % 9}",
+        'note': NOTES[idx % len(NOTES)].format(idx % 10, idx % 10 + 1),
+        'receipt': {'id': idx % 10},
+    }
+    level = 'ERROR' if idx % 5 == 0 else 'INFO'
+    return json.dumps({'text': '', 'record': {
+        'extra': extra, 'level': {'name': level}, 'message': f"Receipt {idx} processed",
+        'time': {'repr': f"2024-05-01 10:00:{idx % 60:02d}+03:00"},
+    }})
+
+
+class IndexedRowsTest(unittest.TestCase):
+    """Ответ по индексам совпадает с полным просмотром match()."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(handle, 'w') as f:
+            f.write('\n'.join(sample_line(idx) for idx in range(1000)) + '\n')
+        self.store = LogStore(LogFile(self.path))
+        parse_serial(self.store)
+
+    def tearDown(self):
+        self.store.close()
+        os.remove(self.path)
+
+    def test_rows_match_full_scan(self):
+        self.assertTrue(self.store.is_indexed())
+        for query in QUERIES:
+            log_filter = compile_filter(query)
+            expected = [idx for idx in range(len(self.store)) if log_filter.node.match(self.store, idx)]
+            with self.subTest(query=query):
+                self.assertTrue(expected)
+                self.assertEqual(list(log_filter.rows(self.store)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import parse_serial
+from logfile import LogFile
+from records import LogStore
+
+
+def record_line(idx):
+    return json.dumps({'text': '', 'record': {'level': {'name': 'INFO'}, 'message': f"Receipt {idx} processed"}})
+
+
+class PartialLineTest(unittest.TestCase):
+    """Строка без перевода строки в конце файла ждет его и не становится записью ERROR."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.log')
+        self.last = record_line(2).encode()
+        with os.fdopen(handle, 'wb') as f:
+            f.write(f"{record_line(0)}\n{record_line(1)}\n".encode() + self.last[:20])
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def append(self, data):
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def test_open_and_refresh(self):
+        source = LogFile(self.path)
+        self.assertEqual(len(source), 2)
+        self.assertEqual(source.refresh(), 0)
+        self.append(self.last[20:40])
+        self.assertEqual(source.refresh(), 0)
+        self.append(self.last[40:] + b'\n')
+        self.assertEqual(source.refresh(), 1)
+        self.assertEqual(source.line(2), self.last)
+        source.close()
+
+    def test_truncated_or_rewritten(self):
+        source = LogFile(self.path)
+        with open(self.path, 'r+b') as f:
+            f.seek(source.size - 1)
+            f.write(b' ')
+        self.assertIsNone(source.refresh())
+        source.close()
+        source = LogFile(self.path)
+        os.truncate(self.path, 10)
+        self.assertIsNone(source.refresh())
+        source.close()
+
+    def test_scan_steps(self):
+        source = LogFile(self.path, array('Q'), 0)
+        self.assertEqual(sum(source.scan_steps()), 2)
+        self.append(self.last[20:] + b'\n')
+        self.assertEqual(source.refresh(), 1)
+        source.close()
+
+    def test_no_error_records(self):
+        store = LogStore(LogFile(self.path))
+        parse_serial(store)
+        self.assertEqual([store.level(idx) for idx in range(len(store))], ['INFO', 'INFO'])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
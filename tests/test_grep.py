@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filters import FilterSyntaxError
+from grep import compile_raw_pattern
+
+LINES = {
+    'plain': 'Чек 42 закрыт'.encode('utf-8'),
+    'escaped': b'"message": "\\u0427\\u0435\\u043a 42 \\u0437\\u0430\\u043a\\u0440\\u044b\\u0442"',
+    'mixed': 'чЕК 42'.encode('utf-8'),
+}
+
+
+class RawPatternTest(unittest.TestCase):
+    def test_ignore_case_cyrillic(self):
+        pattern = compile_raw_pattern('/чек 42/i')
+        for name, line in LINES.items():
+            with self.subTest(name):
+                self.assertIsNotNone(pattern.search(line))
+
+    def test_case_sensitive_cyrillic(self):
+        pattern = compile_raw_pattern('/Чек/')
+        self.assertIsNotNone(pattern.search(LINES['plain']))
+        self.assertIsNotNone(pattern.search(LINES['escaped']))
+        self.assertIsNone(pattern.search(LINES['mixed']))
+
+    def test_dot_matches_whole_character(self):
+        self.assertEqual(compile_raw_pattern('/^Ч.к /').search(LINES['plain']).group(), 'Чек '.encode('utf-8'))
+        self.assertIsNone(compile_raw_pattern('/^Ч..к/').search(LINES['plain']))
+
+    def test_non_ascii_class_rejected(self):
+        with self.assertRaises(FilterSyntaxError):
+            compile_raw_pattern('/[чЧ]ек/')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import NO_TIMESTAMP, parse_log
+
+
+class ParseLogTest(unittest.TestCase):
+    def test_non_string_message_and_level(self):
+        level, timestamp, utc_offset, message, extra = parse_log(
+            b'{"record": {"message": null, "level": {"name": 5}}}'
+        )
+        self.assertEqual((level, timestamp, message, extra), ('UNKNOWN', NO_TIMESTAMP, 'None', {}))
+
+    def test_invalid_json(self):
+        self.assertEqual(parse_log(b'{"record":')[0], 'ERROR')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import parse_serial
+from logfile import LogFile
+from patterns import pattern_members
+from records import LogStore
+
+
+class PatternMembersTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(handle, 'w') as f:
+            for idx in range(300):
+                message = f"Receipt {idx} failed on kkt{idx:04d}" if idx % 3 else f"Shift {idx} opened"
+                f.write(json.dumps({'text': '', 'record': {'level': {'name': 'INFO'}, 'message': message}}) + '\n')
+        self.store = LogStore(LogFile(self.path))
+        parse_serial(self.store)
+
+    def tearDown(self):
+        self.store.close()
+        os.remove(self.path)
+
+    def test_letter_prefixed_ids(self):
+        templates = [pattern.template() for pattern in self.store.patterns.patterns]
+        number = templates.index('Receipt <*> failed on kkt<*>')
+        self.assertEqual(pattern_members(self.store, number, 1000), [idx for idx in range(300) if idx % 3])
+        self.assertEqual(len(pattern_members(self.store, number, 50)), 50)
+
+    def test_every_pattern(self):
+        """Каждая запись находится среди записей своего шаблона."""
+        for number, pattern in enumerate(self.store.patterns.patterns):
+            with self.subTest(pattern.template()):
+                self.assertEqual(len(pattern_members(self.store, number, 1000)), pattern.count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import parse_parallel, parse_serial
+from logfile import LogFile
+from records import LogStore
+from search import matches_query, record_text, tokenize
+
+EXTRAS = [
+    {'note': 'Receipt header\nFiscal total 42'},
+    {'pair': 'left\tright', 'nested': {'items': ['say "hello"', 'C:\\kkt\\fiscal']}},
+    {'shift_id': 7, 'total': 1.5, 'closed': True, 'operator': None},
+]
+QUERIES = {
+    'fiscal': [0, 1],
+    'right': [1],
+    'hello': [1],
+    '"kkt fiscal"': [1],
+    'true': [2],
+    'null': [2],
+    'nested': [],
+    'nfiscal': [],
+    'tright': [],
+}
+
+
+class RecordTextTest(unittest.TestCase):
+    def test_escaped_characters(self):
+        self.assertEqual(tokenize(record_text('Saved', EXTRAS[0])), ['saved', 'receipt', 'header', 'fiscal', 'total', '42'])
+        self.assertEqual(tokenize(record_text('Saved', EXTRAS[1])), ['saved', 'left', 'right', 'say', 'hello', 'c', 'kkt', 'fiscal'])
+
+    def test_scalars_without_keys(self):
+        self.assertEqual(tokenize(record_text('Saved', EXTRAS[2])), ['saved', '7', '1', '5', 'true', 'null'])
+
+
+class TextIndexTest(unittest.TestCase):
+    """Последовательный разбор и пул процессов строят одинаковый индекс extra."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(handle, 'w') as f:
+            for extra in EXTRAS:
+                f.write(json.dumps({'text': '', 'record': {'extra': extra, 'level': {'name': 'INFO'}, 'message': 'Saved'}}) + '\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_search(self):
+        for parse in (parse_serial, lambda store: parse_parallel(store, workers=1)):
+            store = LogStore(LogFile(self.path))
+            parse(store)
+            for query, rows in QUERIES.items():
+                with self.subTest(parse=parse, query=query):
+                    self.assertEqual(list(store.search(query)), rows)
+                    # Так новые строки проверяются при слежении за файлом
+                    self.assertEqual([idx for idx in range(len(store)) if matches_query(query, store.row_text(idx))], rows)
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
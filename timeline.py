@@ -0,0 +1,144 @@
+from bisect import bisect_left
+from collections import Counter
+from itertools import compress, islice, repeat
+from operator import add, floordiv, le, mul, ne
+
+from filters import DAY, MINUTE
+from utils import NO_TIMESTAMP
+
+
+LEVEL_SLOTS = 256
+
+
+def is_sorted(values):
+    return all(map(le, values, islice(values, 1, None)))
+
+
+def sorted_counts(timestamps, levels, utc_offset, level_count):
+    """Счетчик ключей гистограммы для упорядоченных по времени строк с одним поясом.
+
+    Границы минут находятся бинарным поиском, а уровни внутри минуты
+    считаются bytes.count, поэтому работа в Python идет по минутам, а не по строкам.
+    """
+    counts = Counter()
+    levels = levels.tobytes()
+    codes = [(code, bytes((code,))) for code in range(level_count)]
+    pos = 0
+    while pos < len(timestamps):
+        minute = (timestamps[pos] + utc_offset) // MINUTE
+        end = bisect_left(timestamps, (minute + 1) * MINUTE - utc_offset, pos)
+        chunk = levels[pos:end]
+        for code, code_byte in codes:
+            count = chunk.count(code_byte)
+            if count:
+                counts[minute * LEVEL_SLOTS + code] = count
+        pos = end
+    return counts
+
+
+class TimeHistogram:
+    """Число записей по минутам местного времени и кодам уровней.
+
+    Ключ счетчика - минута * 256 + код уровня. Ключи считаются по колонкам
+    хранилища целиком в C (map/compress/Counter или bisect и bytes.count
+    для упорядоченного лога), без цикла по строкам в Python. Строки добавляются по мере индексации, поэтому при слежении
+    за файлом пересчитываются только новые.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.size = 0
+        self.first = None
+        self.last = None
+        self.level_names = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def update(self, store):
+        """Учитывает строки, проиндексированные с прошлого раза; True, если гистограмма изменилась."""
+        stop = store.indexed_count
+        if stop <= self.size:
+            return False
+
+        timestamps = store.timestamps[self.size:stop]
+        levels = store.levels[self.size:stop]
+        utc_offsets = store.utc_offsets[self.size:stop]
+        if min(utc_offsets) == max(utc_offsets) and NO_TIMESTAMP not in timestamps and is_sorted(timestamps):
+            counts = sorted_counts(timestamps, levels, utc_offsets[0] * MINUTE, len(store.level_names))
+        else:
+            keep = list(map(ne, timestamps, repeat(NO_TIMESTAMP)))
+            wall_times = map(add, compress(timestamps, keep), map(mul, compress(utc_offsets, keep), repeat(MINUTE)))
+            minutes = map(floordiv, wall_times, repeat(MINUTE))
+            counts = Counter(map(add, map(mul, minutes, repeat(LEVEL_SLOTS)), compress(levels, keep)))
+        self.size = stop
+        self.level_names = store.level_names
+        if not counts:
+            return False
+
+        self.counts.update(counts)
+        first = min(counts) // LEVEL_SLOTS
+        last = max(counts) // LEVEL_SLOTS
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+        return True
+
+    def columns(self, width):
+        """Делит интервал лога на width колонок: список словарей имя уровня -> число записей."""
+        columns = [Counter() for _ in range(width)]
+        if not self.counts or width <= 0:
+            return columns
+        span = self.last - self.first + 1
+        for key, count in self.counts.items():
+            minute, code = divmod(key, LEVEL_SLOTS)
+            columns[(minute - self.first) * width // span][self.level_names[code]] += count
+        return columns
+
+    def column_time(self, x, width):
+        """Местное время (микросекунды) начала колонки x."""
+        span = self.last - self.first + 1
+        return (self.first + x * span // width) * MINUTE
+
+
+def wall_time_on_log_day(store, time_of_day, span=MINUTE):
+    """Переводит время суток в местное время первого дня лога, когда этот момент не раньше начала лога."""
+    time_index = store.time_index()
+    if not len(time_index):
+        return None
+    first_wall = time_index.times[0] + store.utc_offsets[time_index.rows[0]] * MINUTE
+    wall_time = first_wall // DAY * DAY + time_of_day
+    if wall_time + span <= first_wall:
+        wall_time += DAY
+    return wall_time
+
+
+def find_time_row(store, wall_time, rows=None, count=None):
+    """Позиция первой записи с местным временем не раньше wall_time.
+
+    rows - возрастающие номера видимых строк (первые count из них), тогда
+    возвращается позиция в rows, иначе номер строки хранилища; None, если
+    таких записей нет. Начало ищется бинарным поиском по индексу времени.
+    Если лог упорядочен по времени, видимая строка находится бинарным
+    поиском по rows, иначе записи перебираются по возрастанию времени до
+    первой видимой.
+    """
+    time_index = store.time_index()
+    if not len(time_index):
+        return None
+    if rows is not None and count is None:
+        count = len(rows)
+
+    times = time_index.times
+    offsets = store.utc_offsets
+    for pos in range(bisect_left(times, wall_time - max(offsets) * MINUTE), len(times)):
+        idx = time_index.rows[pos]
+        if times[pos] + offsets[idx] * MINUTE < wall_time:
+            continue
+        if rows is None:
+            return idx
+        position = bisect_left(rows, idx, 0, count)
+        if time_index.ordered:
+            return position if position < count else None
+        if position < count and rows[position] == idx:
+            return position
+    return None
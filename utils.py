@@ -1,81 +1,88 @@
-import json
-from datetime import datetime
-
-from PyQt5.QtWidgets import QDialog, QProgressBar, QLabel, QVBoxLayout
-from PyQt5.QtGui import QColor, QTextCharFormat
-from PyQt5.QtCore import Qt
-
-class CustomProgressDialog(QDialog):
-    def __init__(self, title, message, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle(title)
-        self.setStyleSheet("background-color: #E0E0E0;")
-        self.setFixedSize(300, 100)
-
-        self.progress_bar = QProgressBar(self)
-        self.progress_bar.setAlignment(Qt.AlignCenter)
-        self.progress_bar.setMaximum(100)
-        self.progress_bar.setMinimum(0)
-        self.progress_bar.setValue(0)
-        self.progress_bar.setTextVisible(True)
-        self.progress_bar.setStyleSheet(
-            "QProgressBar {border: 2px solid gray; border-radius: 5px; padding: 1px; text-align: center;} "
-            "QProgressBar::chunk {background: #4CAF50; width: 20px;}"
-        )
-
-        layout = QVBoxLayout()
-        layout.addWidget(QLabel(message, self))
-        layout.addWidget(self.progress_bar)
-        self.setLayout(layout)
-
-def format_timestamp(timestamp_str):
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from decoders import loads
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+SECOND = timedelta(seconds=1)
+NO_TIMESTAMP = -(1 << 63)
+
+
+@lru_cache(maxsize=4096)
+def local_seconds(prefix):
+    """Секунды эпохи для префикса 'YYYY-MM-DD HH:MM:SS' без учета пояса."""
+    return (datetime.fromisoformat(prefix) - EPOCH) // SECOND
+
+
+def parse_timestamp(timestamp_str):
+    """Возвращает (микросекунды эпохи, смещение пояса в минутах) или (NO_TIMESTAMP, 0).
+
+    Для формата time.repr loguru ('2024-05-01 10:00:00.123456+03:00') поля
+    берутся срезами по фиксированным позициям, а дата и время до секунды
+    переводятся в число один раз на секунду через кэш. Остальные строки
+    разбираются через datetime.fromisoformat.
+    """
+    if len(timestamp_str) == 32 and timestamp_str[19] == '.' and timestamp_str[26] in '+-' and timestamp_str[29] == ':':
+        try:
+            seconds = local_seconds(timestamp_str[:19])
+            micros = int(timestamp_str[20:26])
+            utc_offset = int(timestamp_str[27:29]) * 60 + int(timestamp_str[30:])
+        except ValueError:
+            return NO_TIMESTAMP, 0
+        if timestamp_str[26] == '-':
+            utc_offset = -utc_offset
+        return (seconds - utc_offset * 60) * 1000000 + micros, utc_offset
+
     if timestamp_str.endswith('Z'):
         timestamp_str = timestamp_str[:-1] + '+00:00'
     try:
         dt = datetime.fromisoformat(timestamp_str)
-        return dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     except ValueError:
-        return timestamp_str
+        return NO_TIMESTAMP, 0
+    offset = dt.utcoffset() or timedelta(0)
+    timestamp = (dt.replace(tzinfo=None) - EPOCH - offset) // MICROSECOND
+    return timestamp, int(offset.total_seconds()) // 60
+
+
+@lru_cache(maxsize=1024)
+def format_second(seconds):
+    return (EPOCH + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_timestamp(timestamp, utc_offset=0):
+    """Местное время записи с миллисекундами; вызывается только для показанных строк."""
+    if timestamp == NO_TIMESTAMP:
+        return 'Unknown time'
+    seconds, micros = divmod(timestamp + utc_offset * 60000000, 1000000)
+    return f"{format_second(seconds)}.{micros // 1000:03d}"
+
 
 def parse_log(log_str):
+    """Разбирает строку лога loguru в (уровень, время, смещение пояса, сообщение, extra).
+
+    extra возвращается декодированным словарем без повторной сериализации:
+    JSON для таблицы и подробного вывода строится только для показанных записей.
+    """
     try:
-        log = json.loads(log_str)
+        log = loads(log_str)
         record = log.get('record', {})
 
-        timestamp = format_timestamp(record.get('time', {}).get('repr', 'Unknown time'))
+        timestamp, utc_offset = parse_timestamp(record.get('time', {}).get('repr', 'Unknown time'))
         level = record.get('level', {}).get('name', 'UNKNOWN')
         message = record.get('message', 'No message')
+        # Поиск и вывод работают со строками; null или число в JSON не должны их ронять
+        if not isinstance(level, str):
+            level = 'UNKNOWN'
+        if not isinstance(message, str):
+            message = str(message)
+
+        extra = record.get('extra') or {}
 
-        level_formats = {
-            "INFO": (QColor('green'), QColor('#E0E0E0')),
-            "WARNING": (QColor('white'), QColor('#FFA500')),
-            "ERROR": (QColor('white'), QColor('red')),
-            "CRITICAL": (QColor('white'), QColor('magenta')),
-            "DEBUG": (QColor('#00B2FF'), QColor('#E0E0E0'))
-        }
-        fg_color, bg_color = level_formats.get(level, (QColor('black'), QColor('#E0E0E0')))
-
-        output_parts = [
-            ("Timestamp: ", QColor('blue'), QColor('#E0E0E0')),
-            (f"{timestamp}\n", QColor('black'), QColor('#E0E0E0')),
-            ("Level: ", QColor('blue'), QColor('#E0E0E0')),
-            (f"{level}\n", fg_color, bg_color),
-            ("Message: ", QColor('blue'), QColor('#E0E0E0')),
-            (f"{message}\n", QColor('black'), QColor('#E0E0E0'))
-        ]
-
-        extra = record.get('extra', {})
-        if extra:
-            for key, value in extra.items():
-                output_parts.extend([
-                    (f"  {key}: ", QColor('blue'), QColor('#E0E0E0')),
-                    (json.dumps(value, indent=4, ensure_ascii=False) + "\n", QColor('black'), QColor('#E0E0E0'))
-                ])
-
-        return output_parts, level
-    except json.JSONDecodeError as e:
-        return [(f"Error parsing log string: {e}", QColor('red'), QColor('#E0E0E0'))], 'ERROR'
+        return level, timestamp, utc_offset, message, extra
+    except ValueError as e:
+        return 'ERROR', NO_TIMESTAMP, 0, f"Error parsing log string: {e}", {}
     except KeyError as e:
-        return [(f"Missing expected key: {e}", QColor('red'), QColor('#E0E0E0'))], 'ERROR'
+        return 'ERROR', NO_TIMESTAMP, 0, f"Missing expected key: {e}", {}
     except Exception as e:
-        return [(f"An unexpected error occurred: {e}", QColor('red'), QColor('#E0E0E0'))], 'ERROR'
+        return 'ERROR', NO_TIMESTAMP, 0, f"An unexpected error occurred: {e}", {}
@@ -0,0 +1,262 @@
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import (
+    QDialog, QLabel, QProgressBar, QPushButton, QToolTip, QTreeWidget, QTreeWidgetItem, QVBoxLayout, QWidget
+)
+
+from decoders import dumps_compact
+from patterns import pattern_members
+from records import LEVEL_SEVERITY
+from timeline import TimeHistogram
+from utils import format_timestamp
+
+MEMBER_LIMIT = 1000
+CHILD_LIMIT = 1000
+
+
+class CustomProgressDialog(QDialog):
+    canceled = pyqtSignal()
+
+    def __init__(self, title, message, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setStyleSheet("background-color: #E0E0E0;")
+        self.setFixedSize(300, 130)
+
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setMinimum(0)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setStyleSheet(
+            "QProgressBar {border: 2px solid gray; border-radius: 5px; padding: 1px; text-align: center;} "
+            "QProgressBar::chunk {background: #4CAF50; width: 20px;}"
+        )
+
+        self.label = QLabel(message, self)
+        cancel_button = QPushButton('Cancel', self)
+        cancel_button.clicked.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(cancel_button, alignment=Qt.AlignRight)
+        self.setLayout(layout)
+
+    def reject(self):
+        """Кнопка Cancel, Esc и закрытие окна отменяют задачу."""
+        self.canceled.emit()
+        super().reject()
+
+
+class TimelineWidget(QWidget):
+    """Полоса плотности записей по минутам с разбивкой по уровням.
+
+    Клик по полосе отправляет timeSelected с местным временем колонки;
+    пока время не разобрано, клик отправляет buildRequested.
+    """
+
+    timeSelected = pyqtSignal(object)
+    buildRequested = pyqtSignal()
+
+    def __init__(self, level_colors, parent=None):
+        super().__init__(parent)
+        self.level_colors = {level: QColor(color) for level, color in level_colors.items()}
+        self.other_color = QColor('gray')
+        self.histogram = TimeHistogram()
+        self.column_cache = None
+        self.setFixedHeight(60)
+        self.setMouseTracking(True)
+        self.setCursor(Qt.PointingHandCursor)
+
+    def reset(self):
+        self.histogram = TimeHistogram()
+        self.column_cache = None
+        self.update()
+
+    def refresh(self, store):
+        if self.histogram.update(store):
+            self.column_cache = None
+            self.update()
+
+    def columns(self):
+        width = self.width()
+        if self.column_cache is None or self.column_cache[0] != width:
+            self.column_cache = (width, self.histogram.columns(width))
+        return self.column_cache[1]
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor('#E0E0E0'))
+        if not len(self.histogram):
+            painter.drawText(self.rect(), Qt.AlignCenter, 'Timeline: click to parse timestamps')
+            return
+
+        columns = self.columns()
+        height = self.height() - 14
+        peak = max(sum(column.values()) for column in columns) or 1
+        for x, column in enumerate(columns):
+            y = height
+            for level in sorted(column, key=lambda name: LEVEL_SEVERITY.get(name, 0)):
+                bar = max(1, column[level] * height // peak)
+                painter.fillRect(x, y - bar, 1, bar, self.level_colors.get(level, self.other_color))
+                y -= bar
+
+        painter.setPen(QColor('black'))
+        width = self.width()
+        text_rect = self.rect().adjusted(2, 0, -2, 0)
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignBottom, self.time_text(0, width))
+        painter.drawText(text_rect, Qt.AlignRight | Qt.AlignBottom, self.time_text(width - 1, width))
+
+    def time_text(self, x, width):
+        return format_timestamp(self.histogram.column_time(x, width))[:16]
+
+    def mouseMoveEvent(self, event):
+        if len(self.histogram):
+            x = min(max(event.x(), 0), self.width() - 1)
+            column = self.columns()[x]
+            counts = ", ".join(f"{level}: {count}" for level, count in sorted(column.items()))
+            QToolTip.showText(event.globalPos(), f"{self.time_text(x, self.width())}  {counts}", self)
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton:
+            return
+        if not len(self.histogram):
+            self.buildRequested.emit()
+            return
+        x = min(max(event.x(), 0), self.width() - 1)
+        self.timeSelected.emit(self.histogram.column_time(x, self.width()))
+
+
+class PatternsDialog(QDialog):
+    """Шаблоны сообщений: число записей, первое и последнее время, число по уровням.
+
+    Раскрытие шаблона показывает его первые MEMBER_LIMIT записей, клик по
+    записи отправляет recordSelected с ее номером в хранилище.
+    """
+
+    recordSelected = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Message Patterns")
+        self.resize(1000, 600)
+        self.store = None
+        self.items = {}
+
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderLabels(["Count", "Template", "First", "Last", "Levels"])
+        self.tree.setStyleSheet("background-color: #E0E0E0; color: #000; font-size: 12pt;")
+        self.tree.setColumnWidth(0, 100)
+        self.tree.setColumnWidth(1, 450)
+        self.tree.setColumnWidth(2, 200)
+        self.tree.setColumnWidth(3, 200)
+        self.tree.setSortingEnabled(True)
+        self.tree.sortByColumn(0, Qt.DescendingOrder)
+        self.tree.itemExpanded.connect(self.show_members)
+        self.tree.itemClicked.connect(self.select_member)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.tree)
+        self.setLayout(layout)
+
+    def reset(self):
+        self.tree.clear()
+        self.items = {}
+        self.store = None
+
+    def refresh(self, store):
+        """Добавляет новые шаблоны и обновляет сводки уже показанных."""
+        if store is not self.store:
+            self.reset()
+            self.store = store
+        with store.lock:
+            summary = store.patterns.summary()
+
+        self.tree.setSortingEnabled(False)
+        for number, (template, count, first, last, levels) in enumerate(summary):
+            item = self.items.get(number)
+            if item is None:
+                item = self.items[number] = QTreeWidgetItem(self.tree)
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                item.setData(1, Qt.UserRole, number)
+            item.setData(0, Qt.DisplayRole, count)
+            item.setText(1, template)
+            item.setText(2, format_timestamp(*first) if first else '')
+            item.setText(3, format_timestamp(*last) if last else '')
+            item.setText(4, ", ".join(
+                f"{level}: {levels[level]}" for level in sorted(levels, key=lambda name: -LEVEL_SEVERITY.get(name, 0))
+            ))
+        self.tree.setSortingEnabled(True)
+
+    def show_members(self, item):
+        number = item.data(1, Qt.UserRole)
+        if number is None or item.childCount():
+            return
+        members = pattern_members(self.store, number, MEMBER_LIMIT)
+        for idx in members:
+            level, timestamp, utc_offset, message, extra = self.store.record(idx)
+            child = QTreeWidgetItem(item)
+            child.setText(1, " ".join(message.splitlines()))
+            child.setText(2, format_timestamp(timestamp, utc_offset))
+            child.setText(4, level)
+            child.setData(0, Qt.UserRole, idx)
+        count = item.data(0, Qt.DisplayRole)
+        if len(members) < count:
+            QTreeWidgetItem(item).setText(1, f"... first {len(members)} of {count} records")
+
+    def select_member(self, item):
+        idx = item.data(0, Qt.UserRole)
+        if idx is not None:
+            self.recordSelected.emit(idx)
+
+
+class JsonTreeWidget(QTreeWidget):
+    """Сворачиваемое дерево JSON для extra выбранной записи.
+
+    Узлы создаются при раскрытии, поэтому большой вложенный ответ не
+    превращается в тысячи элементов, пока его не раскрыли; у раскрытого
+    узла показываются первые CHILD_LIMIT элементов.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setHeaderLabels(["Key", "Value"])
+        self.setStyleSheet("background-color: #E0E0E0; color: #000; font-size: 12pt;")
+        self.setColumnWidth(0, 250)
+        self.itemExpanded.connect(self.add_children)
+        # Вложенные значения держатся здесь, в элементе - только номер: QVariant копирует значение целиком
+        self.values = []
+
+    def clear(self):
+        super().clear()
+        self.values = []
+
+    def show_value(self, value):
+        self.clear()
+        self.add_items(self.invisibleRootItem(), value if isinstance(value, (dict, list)) else [value])
+
+    def add_items(self, parent, value):
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        count = len(value)
+        for number, (key, child) in enumerate(items):
+            if number >= CHILD_LIMIT:
+                QTreeWidgetItem(parent).setText(1, f"... first {CHILD_LIMIT} of {count} items")
+                break
+            item = QTreeWidgetItem(parent)
+            item.setText(0, str(key))
+            if isinstance(child, (dict, list)) and child:
+                item.setText(1, f"{{{len(child)} keys}}" if isinstance(child, dict) else f"[{len(child)} items]")
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                item.setData(0, Qt.UserRole, len(self.values))
+                self.values.append(child)
+            else:
+                text = child if isinstance(child, str) else dumps_compact(child)
+                item.setText(1, " ".join(text.splitlines()))
+                item.setToolTip(1, text)
+
+    def add_children(self, item):
+        number = item.data(0, Qt.UserRole)
+        if number is not None and not item.childCount():
+            self.add_items(item, self.values[number])